@@ -0,0 +1,266 @@
+from __future__ import annotations
+
+import gzip
+import hashlib
+import os
+import sqlite3
+import tempfile
+import time
+from pathlib import Path
+from typing import BinaryIO, Iterable, Iterator, Literal, Optional
+
+from pydantic import BaseModel
+
+from .config import AppConfig
+
+Compression = Literal["gzip", "zstd"]
+
+CHUNK_CHARS = 1 << 20
+SUFFIXES = {"gzip": ".log.gz", "zstd": ".log.zst"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    digest TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    compressed_size INTEGER NOT NULL,
+    created REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS refs (
+    report TEXT PRIMARY KEY,
+    digest TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS refs_digest ON refs (digest);
+"""
+
+
+class ArchivedLog(BaseModel):
+    archive_dir: Path
+    digest: str
+    path: Path
+    size: int
+    compressed_size: int
+    # False 表示命中已有 blob（去重）
+    created: bool
+
+
+class GCSummary(BaseModel):
+    stale_refs: int = 0
+    removed_blobs: int = 0
+    freed_bytes: int = 0
+    kept_blobs: int = 0
+
+
+def _zstd_writer(fp: BinaryIO, level: Optional[int]) -> BinaryIO:
+    try:
+        import zstandard
+    except ImportError as exc:  # pragma: no cover - 可选依赖
+        raise RuntimeError("使用 zstd 压缩需要安装 zstandard：pip install 'auto-bug[archive]'") from exc
+    compressor = zstandard.ZstdCompressor(level=level if level is not None else 10)
+    return compressor.stream_writer(fp, closefd=False)
+
+
+def iter_text_chunks(text: str, size: int = CHUNK_CHARS) -> Iterator[bytes]:
+    """分片编码，避免一次性生成整份日志的 bytes 副本。"""
+    for start in range(0, len(text), size):
+        yield text[start : start + size].encode("utf-8")
+
+
+class LogArchive:
+    """按内容寻址的原始日志归档：blob 以 sha256 命名并压缩存储，相同日志只保存一份。
+
+    引用关系（报告路径 -> digest）记录在归档目录下的 SQLite 索引中，
+    GC 时清理指向已删除报告的引用，再删除无引用的 blob。
+    """
+
+    def __init__(
+        self, directory: Path, compression: Compression = "gzip", level: Optional[int] = None
+    ):
+        self.directory = directory
+        self.compression = compression
+        self.level = level
+
+    def _connect(self) -> sqlite3.Connection:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.directory / "index.sqlite3", timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+        return conn
+
+    def _blob_path(self, digest: str, compression: Compression) -> Path:
+        return self.directory / digest[:2] / f"{digest}{SUFFIXES[compression]}"
+
+    def find(self, digest: str) -> Optional[Path]:
+        """查找已有 blob（不限压缩格式，切换压缩算法后旧 blob 仍可复用）。"""
+        for compression in SUFFIXES:
+            path = self._blob_path(digest, compression)
+            if path.exists():
+                return path
+        return None
+
+    def _open_writer(self, fp: BinaryIO) -> BinaryIO:
+        if self.compression == "zstd":
+            return _zstd_writer(fp, self.level)
+        level = self.level if self.level is not None else 6
+        return gzip.GzipFile(fileobj=fp, mode="wb", compresslevel=level, mtime=0)
+
+    def _register_blob(self, digest: str, path: Path, size: int) -> None:
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT OR IGNORE INTO blobs (digest, path, size, compressed_size, created) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (
+                        digest,
+                        str(path.relative_to(self.directory)),
+                        size,
+                        path.stat().st_size,
+                        time.time(),
+                    ),
+                )
+        finally:
+            conn.close()
+
+    def _existing(self, digest: str, size: int) -> Optional[ArchivedLog]:
+        path = self.find(digest)
+        if path is None:
+            return None
+        self._register_blob(digest, path, size)
+        return ArchivedLog(
+            archive_dir=self.directory,
+            digest=digest,
+            path=path,
+            size=size,
+            compressed_size=path.stat().st_size,
+            created=False,
+        )
+
+    def store(self, chunks: Iterable[bytes]) -> ArchivedLog:
+        """分块压缩写入临时文件并同时计算摘要，完成后按摘要落位（已存在则丢弃临时文件）。"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        hasher = hashlib.sha256()
+        size = 0
+        fd, tmp_name = tempfile.mkstemp(prefix=".incoming-", dir=self.directory)
+        tmp_path = Path(tmp_name)
+        try:
+            with os.fdopen(fd, "wb") as fp:
+                writer = self._open_writer(fp)
+                try:
+                    for chunk in chunks:
+                        hasher.update(chunk)
+                        size += len(chunk)
+                        writer.write(chunk)
+                finally:
+                    writer.close()
+
+            digest = hasher.hexdigest()
+            existing = self._existing(digest, size)
+            if existing is not None:
+                return existing
+
+            path = self._blob_path(digest, self.compression)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(tmp_path, path)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+
+        self._register_blob(digest, path, size)
+        return ArchivedLog(
+            archive_dir=self.directory,
+            digest=digest,
+            path=path,
+            size=size,
+            compressed_size=path.stat().st_size,
+            created=True,
+        )
+
+    def store_text(self, text: str) -> ArchivedLog:
+        """日志已在内存中时先计算摘要，命中已有 blob 则跳过压缩。"""
+        hasher = hashlib.sha256()
+        size = 0
+        for chunk in iter_text_chunks(text):
+            hasher.update(chunk)
+            size += len(chunk)
+        existing = self._existing(hasher.hexdigest(), size)
+        if existing is not None:
+            return existing
+        return self.store(iter_text_chunks(text))
+
+    def add_reference(self, digest: str, report_path: Path) -> None:
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO refs (report, digest) VALUES (?, ?)",
+                    (str(report_path.resolve()), digest),
+                )
+        finally:
+            conn.close()
+
+    def collect_garbage(self, min_age_seconds: float = 3600.0, dry_run: bool = False) -> GCSummary:
+        """清理已删除报告的引用，并删除引用计数为 0 的 blob。
+
+        新写入但尚未登记引用的 blob 在 min_age_seconds 内受保护，避免与进行中的写入竞争。
+        """
+        summary = GCSummary()
+        cutoff = time.time() - min_age_seconds
+        conn = self._connect()
+        try:
+            refs = conn.execute("SELECT report, digest FROM refs").fetchall()
+            stale = [report for report, _ in refs if not Path(report).exists()]
+            summary.stale_refs = len(stale)
+            stale_set = set(stale)
+            live = {digest for report, digest in refs if report not in stale_set}
+
+            known: set[str] = set()
+            candidates: list[tuple[str, Path]] = []
+            for digest, rel_path, created in conn.execute("SELECT digest, path, created FROM blobs"):
+                known.add(digest)
+                if digest not in live and created < cutoff:
+                    candidates.append((digest, self.directory / rel_path))
+            # 索引丢失或写入中断留下的文件
+            for path in self.directory.glob("??/*.log.*"):
+                digest = path.name.split(".", 1)[0]
+                if digest not in known and digest not in live and path.stat().st_mtime < cutoff:
+                    candidates.append((digest, path))
+            for path in self.directory.glob(".incoming-*"):
+                if path.stat().st_mtime < cutoff:
+                    candidates.append(("", path))
+
+            summary.kept_blobs = len(known) - sum(1 for digest, _ in candidates if digest in known)
+            if dry_run:
+                summary.removed_blobs = sum(1 for digest, _ in candidates if digest)
+                summary.freed_bytes = sum(
+                    path.stat().st_size for _, path in candidates if path.exists()
+                )
+                return summary
+
+            with conn:
+                conn.executemany("DELETE FROM refs WHERE report = ?", [(r,) for r in stale])
+                for digest, path in candidates:
+                    if path.exists():
+                        summary.freed_bytes += path.stat().st_size
+                        path.unlink()
+                    if digest:
+                        summary.removed_blobs += 1
+                        conn.execute("DELETE FROM blobs WHERE digest = ?", (digest,))
+        finally:
+            conn.close()
+        return summary
+
+
+def open_archive(config: AppConfig, base_dir: Path) -> Optional[LogArchive]:
+    """未启用 [archive] 时返回 None。"""
+    if not config.archive.enabled:
+        return None
+    return LogArchive(
+        config.resolve_archive_dir(base_dir),
+        compression=config.archive.compression,
+        level=config.archive.level,
+    )
+
+
+def relative_link(archived: ArchivedLog, report_path: Path) -> str:
+    """报告内使用的相对链接（统一为 / 分隔）。"""
+    return Path(os.path.relpath(archived.path, report_path.parent)).as_posix()
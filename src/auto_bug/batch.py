@@ -0,0 +1,260 @@
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from typing import Iterable, Optional
+
+from pydantic import BaseModel, ValidationError
+from rich.console import Console
+
+from .config import AppConfig
+from .core import (
+    BUG_EXAMPLE,
+    GenerationResult,
+    finalize_bug_record,
+    format_example,
+    generate_bug_record,
+    match_local_rules,
+    slice_json_object,
+)
+from .logs import estimate_tokens, extract_excerpt, extract_stack_summary
+from .models import BatchItem, BatchReportItem, BatchResponse, LLMReport
+from .ratelimit import PRIORITY_BATCH, request_priority
+from .routing import analyze_log, request_report
+from .schema import schema_prompts
+from .stacktrace import StackTrace, parse_stack_trace
+from .usage import usage_scope
+
+console = Console()
+
+DEFAULT_TOKEN_BUDGET = 6000
+DEFAULT_MAX_ITEMS = 8
+
+
+class PreparedItem(BaseModel):
+    item: BatchItem
+    excerpt: str
+    stack_summary: str
+    tokens: int
+    fingerprint: Optional[str] = None
+    # 完整日志的堆栈解析结果，供本地规则确认最终异常
+    trace: Optional[StackTrace] = None
+
+
+def prepare_item(item: BatchItem) -> PreparedItem:
+    trace = parse_stack_trace(item.log_text)
+    excerpt = extract_excerpt(item.log_text)
+    stack_summary = extract_stack_summary(item.log_text, trace=trace)
+    return PreparedItem(
+        item=item,
+        excerpt=excerpt,
+        stack_summary=stack_summary,
+        tokens=estimate_tokens(excerpt) + estimate_tokens(stack_summary),
+        fingerprint=trace.fingerprint,
+        trace=trace,
+    )
+
+
+def pack_batches(
+    prepared: Iterable[PreparedItem],
+    token_budget: int = DEFAULT_TOKEN_BUDGET,
+    max_items: int = DEFAULT_MAX_ITEMS,
+) -> list[list[PreparedItem]]:
+    """按 token 预算装箱：先放大日志，再用小日志填缝（first-fit decreasing）。
+
+    单条超出预算的日志独占一个批次。
+    """
+    bins: list[list[PreparedItem]] = []
+    loads: list[int] = []
+    for entry in sorted(prepared, key=lambda e: e.tokens, reverse=True):
+        for idx, load in enumerate(loads):
+            if load + entry.tokens <= token_budget and len(bins[idx]) < max_items:
+                bins[idx].append(entry)
+                loads[idx] += entry.tokens
+                break
+        else:
+            bins.append([entry])
+            loads.append(entry.tokens)
+    return bins
+
+
+def build_batch_messages(
+    config: AppConfig,
+    project: str,
+    batch: list[PreparedItem],
+) -> list[dict[str, str]]:
+    system_prompt = (
+        config.llm.prompt.system
+        or "你是一名资深 QA 工程师，请为每条日志分别生成结构化的缺陷报告 JSON。"
+    )
+
+    user_payload = {
+        "project": project,
+        "default_tags": config.llm.prompt.default_tags or "",
+        "logs": [
+            {
+                "id": entry.item.id,
+                "command": entry.item.command,
+                "log_excerpt": entry.excerpt,
+                "stack_summary": entry.stack_summary,
+            }
+            for entry in batch
+        ],
+    }
+    if not schema_prompts(config.llm):
+        user_payload["expected_fields"] = ["id", *LLMReport.model_fields]
+    example = {"reports": [{"id": "<输入 id>", **BUG_EXAMPLE}]}
+
+    return [
+        {"role": "system", "content": system_prompt},
+        {
+            "role": "user",
+            "content": (
+                "请严格输出 JSON 对象，reports 数组中每条日志对应一项，并原样带回输入 id，不要包含额外说明。\n"
+                f"{format_example(config, example)}"
+                f"当前输入：```json\n{json.dumps(user_payload, ensure_ascii=False)}\n```"
+            ),
+        },
+    ]
+
+
+def parse_batch_json(raw: str) -> dict[str, LLMReport]:
+    data = json.loads(slice_json_object(raw))
+    reports = data.get("reports") if isinstance(data, dict) else None
+    if not isinstance(reports, list):
+        raise ValueError(f"批量响应缺少 reports 数组：{raw[:200]}")
+
+    results: dict[str, LLMReport] = {}
+    for entry in reports:
+        item = BatchReportItem.model_validate(entry)
+        results[item.id] = LLMReport.model_validate(item.model_dump(exclude={"id"}))
+    return results
+
+
+def generate_bug_records_batch(
+    *,
+    base_dir: Path,
+    config: AppConfig,
+    project: str,
+    items: Iterable[BatchItem],
+    persist: bool = True,
+    token_budget: int = DEFAULT_TOKEN_BUDGET,
+    max_items: int = DEFAULT_MAX_ITEMS,
+    force_llm: bool = False,
+) -> list[GenerationResult]:
+    """把多条小日志打包进少量 LLM 请求，再拆分为独立的 bugNNN.md。
+
+    命中本地规则的日志不进入批次；批次响应无法解析或缺少某些 id 时，
+    对缺失项逐条回退到 generate_bug_record。结果顺序与输入一致。
+    """
+    items = list(items)
+    ids = [item.id for item in items]
+    if len(set(ids)) != len(ids):
+        raise ValueError("批量输入中存在重复的 id")
+
+    with request_priority(PRIORITY_BATCH):
+        return _generate_batch(
+            base_dir=base_dir,
+            config=config,
+            project=project,
+            items=items,
+            persist=persist,
+            token_budget=token_budget,
+            max_items=max_items,
+            force_llm=force_llm,
+        )
+
+
+def _generate_batch(
+    *,
+    base_dir: Path,
+    config: AppConfig,
+    project: str,
+    items: list[BatchItem],
+    persist: bool,
+    token_budget: int,
+    max_items: int,
+    force_llm: bool,
+) -> list[GenerationResult]:
+    prepared = [prepare_item(item) for item in items]
+
+    results: dict[str, GenerationResult] = {}
+    pending: list[PreparedItem] = []
+    for entry in prepared:
+        local = None
+        if not force_llm:
+            local = match_local_rules(
+                base_dir, config, entry.excerpt, entry.item.command, entry.trace
+            )
+        if local is None:
+            pending.append(entry)
+            continue
+        results[entry.item.id] = finalize_bug_record(
+            base_dir=base_dir,
+            config=config,
+            project=project,
+            report=local,
+            command=entry.item.command,
+            environment=entry.item.environment,
+            excerpt=entry.excerpt,
+            stack_summary=entry.stack_summary,
+            persist=persist,
+            fingerprint=entry.fingerprint,
+            log_text=entry.item.log_text,
+        )
+
+    batches = pack_batches(pending, token_budget=token_budget, max_items=max_items)
+    for batch in batches:
+        reports: dict[str, LLMReport] = {}
+        if len(batch) > 1:
+            try:
+                with usage_scope(
+                    config.resolve_usage_ledger(base_dir),
+                    project=project,
+                    tool="batch",
+                    log_chars=sum(len(entry.item.log_text) for entry in batch),
+                ):
+                    reports = request_report(
+                        config.llm,
+                        build_batch_messages(config, project, batch),
+                        parse_batch_json,
+                        tool="batch",
+                        schema=BatchResponse,
+                        features=analyze_log(
+                            "\n".join(entry.excerpt for entry in batch),
+                            "\n".join(entry.stack_summary for entry in batch),
+                        ),
+                    )
+            except (ValueError, ValidationError) as exc:
+                console.print(f"[yellow]批量响应解析失败，逐条回退：{exc}[/yellow]")
+
+        for entry in batch:
+            item = entry.item
+            report = reports.get(item.id)
+            if report is None:
+                results[item.id] = generate_bug_record(
+                    base_dir=base_dir,
+                    config=config,
+                    project=project,
+                    log_text=item.log_text,
+                    command=item.command,
+                    environment=item.environment,
+                    persist=persist,
+                    force_llm=True,
+                )
+                continue
+            results[item.id] = finalize_bug_record(
+                base_dir=base_dir,
+                config=config,
+                project=project,
+                report=report,
+                command=item.command,
+                environment=item.environment,
+                excerpt=entry.excerpt,
+                stack_summary=entry.stack_summary,
+                persist=persist,
+                fingerprint=entry.fingerprint,
+                log_text=item.log_text,
+            )
+
+    return [results[item.id] for item in items]
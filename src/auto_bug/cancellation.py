@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Iterator, List, Optional, TypeVar
+
+from .stats import stats
+
+T = TypeVar("T")
+
+
+class RequestCancelled(Exception):
+    """MCP 客户端取消请求或断开连接后，工作线程中的后续步骤以此中止。
+
+    不继承 RuntimeError / ValueError，避免被路由升档或单段摘要的容错逻辑吞掉。
+    """
+
+
+class CancelToken:
+    """跨线程的取消标记：事件循环侧调用 cancel()，工作线程侧轮询或注册回调。"""
+
+    def __init__(self) -> None:
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks: List[Callable[[], None]] = []
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self) -> None:
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks = list(self._callbacks)
+        for callback in callbacks:
+            callback()
+
+    def add_callback(self, callback: Callable[[], None]) -> None:
+        """注册取消回调；已取消时立即执行。"""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def remove_callback(self, callback: Callable[[], None]) -> None:
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    def raise_if_cancelled(self) -> None:
+        if self._event.is_set():
+            raise RequestCancelled("客户端已取消请求")
+
+
+_token: ContextVar[Optional[CancelToken]] = ContextVar("auto_bug_cancel_token", default=None)
+
+
+@contextmanager
+def cancel_scope(token: CancelToken) -> Iterator[None]:
+    reset = _token.set(token)
+    try:
+        yield
+    finally:
+        _token.reset(reset)
+
+
+def current_cancel_token() -> Optional[CancelToken]:
+    return _token.get()
+
+
+def raise_if_cancelled() -> None:
+    """在渲染、写盘等阶段之前调用；CLI 等未设置取消标记的上下文中为空操作。"""
+    token = _token.get()
+    if token is not None:
+        token.raise_if_cancelled()
+
+
+async def run_cancellable(tool: str, func: Callable[..., T], /, *args: Any, **kwargs: Any) -> T:
+    """在线程池中执行同步生成流程；协程被取消时通知工作线程中止 LLM 请求与后续写盘。"""
+    token = CancelToken()
+
+    def target() -> T:
+        with cancel_scope(token):
+            token.raise_if_cancelled()
+            return func(*args, **kwargs)
+
+    worker = asyncio.ensure_future(asyncio.to_thread(target))
+    try:
+        return await asyncio.shield(worker)
+    except asyncio.CancelledError:
+        token.cancel()
+        stats.incr("cancellation.requests")
+        stats.incr(f"cancellation.{tool}")
+        cancelled_at = time.perf_counter()
+
+        def finished(future: asyncio.Future[T]) -> None:
+            # 工作线程释放所需时间；同时取走异常，避免 "exception was never retrieved"
+            stats.observe("cancellation.stop_latency", time.perf_counter() - cancelled_at)
+            if not future.cancelled():
+                future.exception()
+
+        worker.add_done_callback(finished)
+        raise
@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from .config import CassetteConfig
+from .stats import stats
+
+# 环境变量优先于配置，便于在测试 / 基准脚本中临时切换
+ENV_MODE = "AUTO_BUG_LLM_MODE"
+ENV_DIR = "AUTO_BUG_CASSETTE_DIR"
+MODES = ("off", "record", "replay")
+
+
+class CassetteMissError(RuntimeError):
+    """回放模式下找不到对应请求的录制结果。"""
+
+
+def request_key(provider: str, payload: Dict[str, Any]) -> str:
+    """请求哈希：provider + 完整请求体（模型、消息、采样参数）的规范化 JSON。"""
+    encoded = json.dumps(
+        {"provider": provider, **payload}, ensure_ascii=False, sort_keys=True, separators=(",", ":")
+    )
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class Cassette:
+    """LLM 请求的录制 / 回放存储：每个请求哈希对应一个 JSON 文件，保存原始响应与耗时。"""
+
+    def __init__(
+        self,
+        directory: Path,
+        mode: str,
+        simulate_latency: bool = False,
+        latency_scale: float = 1.0,
+    ):
+        if mode not in MODES:
+            raise ValueError(f"未知的 LLM 录制模式: {mode}（可选 {', '.join(MODES)}）")
+        self.directory = directory
+        self.mode = mode
+        self.simulate_latency = simulate_latency
+        self.latency_scale = latency_scale
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == "replay"
+
+    @property
+    def recording(self) -> bool:
+        return self.mode == "record"
+
+    def path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.json"
+
+    def replay(self, provider: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        key = request_key(provider, payload)
+        path = self.path(key)
+        if not path.exists():
+            stats.incr("cassette.misses")
+            raise CassetteMissError(
+                f"回放模式未找到录制结果：model={payload.get('model')} key={key[:16]}，"
+                f"期望文件 {path}。请先以 record 模式运行，或检查提示词/模板是否已变化。"
+            )
+        entry = json.loads(path.read_text(encoding="utf-8"))
+        stats.incr("cassette.hits")
+        if self.simulate_latency:
+            time.sleep(float(entry.get("latency", 0.0)) * self.latency_scale)
+        return entry["response"]
+
+    def record(
+        self, provider: str, payload: Dict[str, Any], response: Dict[str, Any], latency: float
+    ) -> Path:
+        key = request_key(provider, payload)
+        path = self.path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        entry = {
+            "provider": provider,
+            "request": payload,
+            "response": response,
+            "latency": round(latency, 4),
+            "recorded_at": time.time(),
+        }
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        tmp_path.write_text(json.dumps(entry, ensure_ascii=False, indent=2), encoding="utf-8")
+        tmp_path.replace(path)
+        stats.incr("cassette.recorded")
+        return path
+
+
+def open_cassette(config: CassetteConfig) -> Optional[Cassette]:
+    """按配置与环境变量（AUTO_BUG_LLM_MODE / AUTO_BUG_CASSETTE_DIR）创建录制器；off 时返回 None。"""
+    mode = os.getenv(ENV_MODE) or config.mode
+    if mode == "off":
+        return None
+    directory = Path(os.getenv(ENV_DIR) or config.directory)
+    return Cassette(
+        directory.expanduser(),
+        mode,
+        simulate_latency=config.simulate_latency,
+        latency_scale=config.latency_scale,
+    )
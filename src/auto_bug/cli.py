@@ -7,10 +7,24 @@ import typer
 from dotenv import load_dotenv
 from rich.console import Console
 from rich.progress import Progress
+from rich.table import Table
 
+from .archive import LogArchive
+from .batch import DEFAULT_MAX_ITEMS, DEFAULT_TOKEN_BUDGET, generate_bug_records_batch
 from .config import AppConfig, load_config
-from .core import GenerationResult, generate_bug_record
+from .core import (
+    CombinedGenerationResult,
+    GenerationResult,
+    generate_bug_record,
+    generate_combined_record,
+)
 from .logs import read_log
+from .models import BatchItem
+from .profiling import profile_options, run_profiled
+from .rerender import rerender_vault
+from .testreports import DEFAULT_MAX_SAMPLES, generate_test_report_records
+from .update import update_report
+from .usage import summarize_usage
 
 console = Console()
 app = typer.Typer(help="auto-bug CLI：日志 -> Obsidian Bug 表单")
@@ -34,6 +48,15 @@ def ingest(
     no_persist: bool = typer.Option(
         False, "--no-persist", help="仅输出 Markdown，不写入 Obsidian Vault"
     ),
+    with_debug: bool = typer.Option(
+        False, "--with-debug", help="单次 LLM 调用同时生成 bugNNN.md 与 debugNNN.md"
+    ),
+    force_llm: bool = typer.Option(
+        False, "--force-llm", help="跳过本地规则快速路径，始终调用 LLM"
+    ),
+    profile: bool = typer.Option(
+        False, "--profile", help="使用 cProfile 剖析本次生成，输出写入 profiles 目录"
+    ),
 ) -> None:
     """读取日志 -> 调用 LLM -> 输出 Markdown 文件到 Obsidian Vault。"""
     load_dotenv()
@@ -52,28 +75,341 @@ def ingest(
         console.print(f"[red]读取日志失败：{exc}[/red]")
         raise typer.Exit(code=1)
 
-    result: GenerationResult
+    result: GenerationResult | CombinedGenerationResult
     with Progress() as progress:
         task = progress.add_task("调用 LLM 生成报告", total=None)
         try:
-            result = generate_bug_record(
+            options = profile_options(
+                config, base_dir, f"ingest-{target_project}", requested=profile
+            )
+            if with_debug:
+                result, _ = run_profiled(
+                    generate_combined_record,
+                    options,
+                    base_dir=base_dir,
+                    config=config,
+                    project=target_project,
+                    log_text=log_text,
+                    command=command,
+                    environment=environment,
+                    persist=not no_persist,
+                )
+            else:
+                result, _ = run_profiled(
+                    generate_bug_record,
+                    options,
+                    base_dir=base_dir,
+                    config=config,
+                    project=target_project,
+                    log_text=log_text,
+                    command=command,
+                    environment=environment,
+                    persist=not no_persist,
+                    force_llm=force_llm,
+                )
+        except Exception as exc:  # pylint: disable=broad-except
+            progress.update(task, completed=True)
+            console.print(f"[red]生成 Bug 报告失败：{exc}[/red]")
+            raise typer.Exit(code=1)
+        progress.update(task, completed=True)
+
+    if isinstance(result, CombinedGenerationResult):
+        print_result(result.bug)
+        console.print("[cyan]调试标题：[/cyan]" + result.debug.report.report_title)
+        print_markdown(result.debug.file_path, result.debug.markdown)
+    else:
+        print_result(result)
+
+
+@app.command()
+def update(
+    project: str = typer.Argument(..., help="项目名称"),
+    report: str = typer.Argument(..., help="报告名称，例如 bug003 或 debug002"),
+    source: str = typer.Argument(..., help="新日志文件路径，或 '-' 表示从标准输入读取"),
+    command: Optional[str] = typer.Option(
+        None, "--command", "-c", help="触发日志的命令（默认沿用原报告）"
+    ),
+    environment: Optional[str] = typer.Option(None, "--env", help="触发环境描述（默认沿用原报告）"),
+    config_path: Optional[Path] = typer.Option(
+        None, "--config", "-f", help="指定配置文件路径（默认仓库根目录 config.toml）"
+    ),
+) -> None:
+    """用新日志增量更新已有报告：只把日志增量与原结构化报告发送给 LLM，原地改写。"""
+    load_dotenv()
+    base_dir = Path.cwd()
+
+    try:
+        config = select_config(base_dir, config_path)
+        log_text = read_log(source)
+    except Exception as exc:  # pylint: disable=broad-except
+        console.print(f"[red]加载失败：{exc}[/red]")
+        raise typer.Exit(code=1)
+
+    with Progress() as progress:
+        task = progress.add_task("调用 LLM 增量更新报告", total=None)
+        try:
+            result = update_report(
                 base_dir=base_dir,
                 config=config,
-                project=target_project,
+                project=project,
+                report=report,
                 log_text=log_text,
                 command=command,
                 environment=environment,
+            )
+        except Exception as exc:  # pylint: disable=broad-except
+            progress.update(task, completed=True)
+            console.print(f"[red]更新报告失败：{exc}[/red]")
+            raise typer.Exit(code=1)
+        progress.update(task, completed=True)
+
+    if not result.llm_called:
+        console.print("[yellow]新日志与上次摘录无差异，未调用 LLM[/yellow]")
+    changed = ", ".join(result.changed_fields) or "无"
+    console.print(f"[cyan]日志增量 {result.delta_lines} 行，更新字段：{changed}[/cyan]")
+    console.print(f"[green]已更新文件：{result.file_path}[/green]")
+
+
+@app.command()
+def backfill(
+    project: str = typer.Argument(..., help="项目名称"),
+    sources: list[Path] = typer.Argument(..., help="多个日志文件路径"),
+    environment: str = typer.Option("CI", "--env", help="触发环境描述"),
+    token_budget: int = typer.Option(
+        DEFAULT_TOKEN_BUDGET, "--token-budget", help="单次批量请求的日志 token 预算"
+    ),
+    max_items: int = typer.Option(DEFAULT_MAX_ITEMS, "--max-items", help="单批最多日志数"),
+    force_llm: bool = typer.Option(
+        False, "--force-llm", help="跳过本地规则快速路径，始终调用 LLM"
+    ),
+    config_path: Optional[Path] = typer.Option(
+        None, "--config", "-f", help="指定配置文件路径（默认仓库根目录 config.toml）"
+    ),
+) -> None:
+    """批量回填：把多条小日志打包进少量 LLM 请求，逐条写入 bugNNN.md。"""
+    load_dotenv()
+    base_dir = Path.cwd()
+
+    try:
+        config = select_config(base_dir, config_path)
+        items = [
+            BatchItem(id=str(source), log_text=read_log(str(source)), environment=environment)
+            for source in sources
+        ]
+    except Exception as exc:  # pylint: disable=broad-except
+        console.print(f"[red]准备批量输入失败：{exc}[/red]")
+        raise typer.Exit(code=1)
+
+    with Progress() as progress:
+        task = progress.add_task(f"批量生成 {len(items)} 份报告", total=None)
+        try:
+            results = generate_bug_records_batch(
+                base_dir=base_dir,
+                config=config,
+                project=project,
+                items=items,
+                token_budget=token_budget,
+                max_items=max_items,
+                force_llm=force_llm,
+            )
+        except Exception as exc:  # pylint: disable=broad-except
+            progress.update(task, completed=True)
+            console.print(f"[red]批量生成失败：{exc}[/red]")
+            raise typer.Exit(code=1)
+        progress.update(task, completed=True)
+
+    for source, result in zip(sources, results):
+        console.print(f"[cyan]{source}[/cyan] -> {result.file_path}  {result.report.bug_title}")
+
+
+@app.command("ingest-tests")
+def ingest_tests(
+    project: str = typer.Argument(..., help="项目名称"),
+    source: Path = typer.Argument(..., help="JUnit XML（.xml）或 pytest --report-log 输出（.jsonl）"),
+    command: str = typer.Option("pytest", "--command", "-c", help="触发测试的命令"),
+    environment: str = typer.Option("CI", "--env", help="触发环境描述"),
+    max_samples: int = typer.Option(
+        DEFAULT_MAX_SAMPLES, "--samples", help="每组发送给 LLM 的代表样本数"
+    ),
+    no_persist: bool = typer.Option(
+        False, "--no-persist", help="仅输出 Markdown，不写入 Obsidian Vault"
+    ),
+    force_llm: bool = typer.Option(
+        False, "--force-llm", help="跳过本地规则快速路径，始终调用 LLM"
+    ),
+    config_path: Optional[Path] = typer.Option(
+        None, "--config", "-f", help="指定配置文件路径（默认仓库根目录 config.toml）"
+    ),
+) -> None:
+    """导入 CI 测试报告：按失败签名分组，每组一次 LLM 调用并写入一份列出全部受影响用例的报告。"""
+    load_dotenv()
+    base_dir = Path.cwd()
+
+    try:
+        config = select_config(base_dir, config_path)
+    except Exception as exc:  # pylint: disable=broad-except
+        console.print(f"[red]配置加载失败：{exc}[/red]")
+        raise typer.Exit(code=1)
+
+    with Progress() as progress:
+        task = progress.add_task(f"分析测试报告 {source.name}", total=None)
+        try:
+            results = generate_test_report_records(
+                base_dir=base_dir,
+                config=config,
+                project=project,
+                source=source,
+                command=command,
+                environment=environment,
                 persist=not no_persist,
+                max_samples=max_samples,
+                force_llm=force_llm,
             )
         except Exception as exc:  # pylint: disable=broad-except
             progress.update(task, completed=True)
-            console.print(f"[red]生成 Bug 报告失败：{exc}[/red]")
+            console.print(f"[red]导入测试报告失败：{exc}[/red]")
             raise typer.Exit(code=1)
         progress.update(task, completed=True)
 
+    if not results:
+        console.print("[green]测试报告中没有失败用例[/green]")
+        return
+    failed = [group for group in results if group.result is None]
+    for group in results:
+        if group.result is None:
+            continue
+        console.print(
+            f"[cyan]{group.signature}[/cyan] {len(group.tests)} 个用例 -> "
+            f"{group.result.file_path or '(未写入)'}  {group.result.report.bug_title}"
+        )
+        if no_persist:
+            console.print(group.result.markdown)
+    if failed:
+        console.print(f"[red]{len(failed)}/{len(results)} 个失败分组未能生成报告：[/red]")
+        for group in failed:
+            console.print(f"[red]  {group.signature}（{len(group.tests)} 个用例）：{group.error}[/red]")
+        raise typer.Exit(code=1)
+
+
+@app.command()
+def rerender(
+    projects: Optional[list[str]] = typer.Argument(None, help="项目名称，不填则处理 Vault 下全部项目"),
+    workers: Optional[int] = typer.Option(None, "--workers", "-j", help="并行进程数，默认 CPU 核数"),
+    force: bool = typer.Option(False, "--force", help="忽略哈希，强制重新渲染全部报告"),
+    config_path: Optional[Path] = typer.Option(
+        None, "--config", "-f", help="指定配置文件路径（默认仓库根目录 config.toml）"
+    ),
+) -> None:
+    """依据 JSON 侧文件用当前模板重新渲染报告，不调用 LLM。"""
+    base_dir = Path.cwd()
+
+    try:
+        config = select_config(base_dir, config_path)
+        summary = rerender_vault(
+            base_dir=base_dir,
+            config=config,
+            projects=projects or None,
+            workers=workers,
+            force=force,
+        )
+    except Exception as exc:  # pylint: disable=broad-except
+        console.print(f"[red]重新渲染失败：{exc}[/red]")
+        raise typer.Exit(code=1)
+
+    console.print(
+        f"[green]已重新渲染 {summary.rendered} 份[/green]，跳过 {summary.skipped} 份未变化的报告"
+    )
+    if summary.orphaned:
+        console.print(
+            f"[yellow]{summary.orphaned} 份报告的 Markdown 已删除，仅剩侧文件，未重新生成[/yellow]"
+        )
+    for failure in summary.failed:
+        console.print(f"[red]{failure}[/red]")
+    if summary.failed:
+        raise typer.Exit(code=1)
+
+
+@app.command()
+def usage(
+    group_by: str = typer.Option(
+        "project", "--by", help="分组维度：project / tool / model / day / log_size"
+    ),
+    since_days: Optional[float] = typer.Option(None, "--since-days", help="仅统计最近 N 天"),
+    project: Optional[str] = typer.Option(None, "--project", "-p", help="仅统计指定项目"),
+    config_path: Optional[Path] = typer.Option(
+        None, "--config", "-f", help="指定配置文件路径（默认仓库根目录 config.toml）"
+    ),
+) -> None:
+    """汇总本地账本中的 token 用量与 LLM 耗时。"""
+    base_dir = Path.cwd()
+
+    try:
+        config = select_config(base_dir, config_path)
+        ledger = config.resolve_usage_ledger(base_dir)
+        if ledger is None:
+            console.print("[yellow]用量账本已在配置中关闭（[usage] enabled = false）[/yellow]")
+            return
+        rows = summarize_usage(ledger, group_by=group_by, since_days=since_days, project=project)
+    except Exception as exc:  # pylint: disable=broad-except
+        console.print(f"[red]读取用量账本失败：{exc}[/red]")
+        raise typer.Exit(code=1)
+
+    table = Table(title=f"LLM 用量（按 {group_by}）")
+    for column in ("分组", "调用", "失败", "输入 token", "输出 token", "缓存命中", "平均耗时(s)", "最大耗时(s)"):
+        table.add_column(column)
+    for row in rows:
+        table.add_row(
+            row.key,
+            str(row.calls),
+            str(row.errors),
+            str(row.prompt_tokens),
+            str(row.completion_tokens),
+            str(row.cached_tokens),
+            f"{row.avg_latency:.2f}",
+            f"{row.max_latency:.2f}",
+        )
+    console.print(table)
+
+
+@app.command("gc-logs")
+def gc_logs(
+    dry_run: bool = typer.Option(False, "--dry-run", help="只统计可回收的 blob，不删除"),
+    min_age: Optional[float] = typer.Option(
+        None, "--min-age", help="未引用 blob 的最小保留秒数（默认读取 [archive] 配置）"
+    ),
+    config_path: Optional[Path] = typer.Option(
+        None, "--config", "-f", help="指定配置文件路径（默认仓库根目录 config.toml）"
+    ),
+) -> None:
+    """清理原始日志归档：移除已删除报告的引用，并删除引用计数为 0 的 blob。"""
+    base_dir = Path.cwd()
+
+    try:
+        config = select_config(base_dir, config_path)
+        archive = LogArchive(config.resolve_archive_dir(base_dir))
+        summary = archive.collect_garbage(
+            min_age_seconds=config.archive.gc_min_age_seconds if min_age is None else min_age,
+            dry_run=dry_run,
+        )
+    except Exception as exc:  # pylint: disable=broad-except
+        console.print(f"[red]清理日志归档失败：{exc}[/red]")
+        raise typer.Exit(code=1)
+
+    action = "可回收" if dry_run else "已删除"
+    console.print(
+        f"[green]失效引用 {summary.stale_refs} 条，{action} blob {summary.removed_blobs} 个"
+        f"（{summary.freed_bytes} 字节），保留 {summary.kept_blobs} 个[/green]"
+    )
+
+
+def print_result(result: GenerationResult) -> None:
     console.print("[cyan]Bug 标题：[/cyan]" + result.report.bug_title)
-    if result.file_path:
-        console.print(f"[green]已写入文件：{result.file_path}[/green]")
+    print_markdown(result.file_path, result.markdown)
+
+
+def print_markdown(file_path: Optional[Path], markdown: str) -> None:
+    if file_path:
+        console.print(f"[green]已写入文件：{file_path}[/green]")
     else:
         console.print("[yellow]未持久化到文件，以下为 Markdown 内容：[/yellow]")
-        console.print(result.markdown)
+        console.print(markdown)
@@ -3,7 +3,7 @@ from __future__ import annotations
 import os
 import tomllib
 from pathlib import Path
-from typing import Optional
+from typing import List, Literal, Optional
 
 from pydantic import BaseModel, Field, ValidationError
 from rich.console import Console
@@ -16,6 +16,47 @@ class PromptConfig(BaseModel):
     default_tags: Optional[str] = None
 
 
+class RateLimitConfig(BaseModel):
+    """按 provider+model 限流；未设置的维度不限制。"""
+
+    requests_per_minute: Optional[int] = None
+    tokens_per_minute: Optional[int] = None
+    # 估算 TPM 时为补全预留的 token 数
+    completion_tokens_estimate: int = 800
+
+
+class CassetteConfig(BaseModel):
+    """LLM 请求录制 / 回放；环境变量 AUTO_BUG_LLM_MODE、AUTO_BUG_CASSETTE_DIR 优先。"""
+
+    mode: Literal["off", "record", "replay"] = "off"
+    # 相对路径基于当前工作目录
+    directory: Path = Path(".auto-bug/cassettes")
+    # 回放时按录制耗时 × latency_scale 休眠，默认全速回放
+    simulate_latency: bool = False
+    latency_scale: float = 1.0
+
+
+# auto：按 provider 与 api_base 判断；json_schema：严格 JSON Schema 结构化输出；json_object：仅保证输出为 JSON
+StructuredOutput = Literal["auto", "json_schema", "json_object"]
+
+
+class ModelTier(BaseModel):
+    """路由档位：按顺序由弱到强排列，未填写的限制视为不限。"""
+
+    name: str
+    model: str
+    provider: Optional[str] = None
+    api_key_env: Optional[str] = None
+    api_base: Optional[str] = None
+    timeout: Optional[float] = None
+    max_log_tokens: Optional[int] = None
+    max_stack_depth: Optional[int] = None
+    max_exceptions: Optional[int] = None
+    tools: List[str] = Field(default_factory=list)
+    rate_limit: Optional[RateLimitConfig] = None
+    structured_output: Optional[StructuredOutput] = None
+
+
 class LLMConfig(BaseModel):
     provider: str = Field(default="openai")
     model: str = Field(default="gpt-4o-mini")
@@ -23,6 +64,76 @@ class LLMConfig(BaseModel):
     api_base: Optional[str] = None
     timeout: float = 30.0
     prompt: PromptConfig = Field(default_factory=PromptConfig)
+    tiers: List[ModelTier] = Field(default_factory=list)
+    rate_limit: RateLimitConfig = Field(default_factory=RateLimitConfig)
+    cassette: CassetteConfig = Field(default_factory=CassetteConfig)
+    structured_output: StructuredOutput = "auto"
+
+    def for_tier(self, tier: ModelTier) -> "LLMConfig":
+        overrides = {
+            name: getattr(tier, name)
+            for name in (
+                "model",
+                "provider",
+                "api_key_env",
+                "api_base",
+                "timeout",
+                "rate_limit",
+                "structured_output",
+            )
+            if getattr(tier, name) is not None
+        }
+        return self.model_copy(update=overrides)
+
+
+class RulesConfig(BaseModel):
+    enabled: bool = True
+    directory: Optional[Path] = None
+    confidence_threshold: float = 0.8
+
+
+class UsageConfig(BaseModel):
+    enabled: bool = True
+    # 默认 <vault_root>/.auto-bug/usage.sqlite3（Obsidian 会忽略点目录）
+    ledger_path: Optional[Path] = None
+
+
+class ProfilingConfig(BaseModel):
+    # 默认 <vault_root>/.auto-bug/profiles
+    directory: Optional[Path] = None
+    # 自动采样概率（0 表示仅在显式请求时剖析）
+    sample_rate: float = 0.0
+    # 两次自动采样之间的最小间隔
+    min_interval_seconds: float = 60.0
+
+
+class ArchiveConfig(BaseModel):
+    """原始日志归档（默认关闭）。"""
+
+    enabled: bool = False
+    # 默认 <vault_root>/.auto-bug/logs
+    directory: Optional[Path] = None
+    # zstd 需要安装可选依赖 zstandard
+    compression: Literal["gzip", "zstd"] = "gzip"
+    level: Optional[int] = None
+    # GC 不删除创建时间短于该值的未引用 blob
+    gc_min_age_seconds: float = 3600.0
+
+
+class SummarizeConfig(BaseModel):
+    """超长日志的 map-reduce 摘要（默认关闭）。"""
+
+    enabled: bool = False
+    # 日志行数超过该值时启用分段摘要
+    min_lines: int = 400
+    chunk_lines: int = 400
+    # 分段数上限，超出时自动增大每段行数
+    max_chunks: int = 32
+    max_concurrency: int = 4
+    # 分段摘要使用的（更便宜的）模型，默认沿用 llm.model
+    model: Optional[str] = None
+    # 默认 <vault_root>/.auto-bug/summaries.sqlite3
+    cache_path: Optional[Path] = None
 
 
 class AppConfig(BaseModel):
@@ -31,6 +142,11 @@ class AppConfig(BaseModel):
     template_path: Path = Field(default=Path("templates/bug_report.md.j2"))
     debug_template_path: Path = Field(default=Path("templates/debug_report.md.j2"))
     llm: LLMConfig = Field(default_factory=LLMConfig)
+    rules: RulesConfig = Field(default_factory=RulesConfig)
+    usage: UsageConfig = Field(default_factory=UsageConfig)
+    profiling: ProfilingConfig = Field(default_factory=ProfilingConfig)
+    archive: ArchiveConfig = Field(default_factory=ArchiveConfig)
+    summarize: SummarizeConfig = Field(default_factory=SummarizeConfig)
 
     def resolve_template(self, base_dir: Path) -> Path:
         template = self.template_path
@@ -44,6 +160,46 @@ class AppConfig(BaseModel):
             template = base_dir / template
         return template
 
+    def resolve_usage_ledger(self, base_dir: Path) -> Optional[Path]:
+        if not self.usage.enabled:
+            return None
+        ledger = self.usage.ledger_path
+        if ledger is None:
+            return self.vault_root / ".auto-bug" / "usage.sqlite3"
+        if not ledger.is_absolute():
+            ledger = base_dir / ledger
+        return ledger
+
+    def resolve_profile_dir(self, base_dir: Path) -> Path:
+        directory = self.profiling.directory
+        if directory is None:
+            return self.vault_root / ".auto-bug" / "profiles"
+        if not directory.is_absolute():
+            directory = base_dir / directory
+        return directory
+
+    def resolve_archive_dir(self, base_dir: Path) -> Path:
+        directory = self.archive.directory
+        if directory is None:
+            return self.vault_root / ".auto-bug" / "logs"
+        if not directory.is_absolute():
+            directory = base_dir / directory
+        return directory
+
+    def resolve_summary_cache(self, base_dir: Path) -> Path:
+        cache = self.summarize.cache_path
+        if cache is None:
+            return self.vault_root / ".auto-bug" / "summaries.sqlite3"
+        if not cache.is_absolute():
+            cache = base_dir / cache
+        return cache
+
+    def resolve_rules_dir(self, base_dir: Path) -> Optional[Path]:
+        directory = self.rules.directory
+        if directory is not None and not directory.is_absolute():
+            directory = base_dir / directory
+        return directory
+
 
 def load_config(base_dir: Path, filename: str = "config.toml") -> AppConfig:
     config_file = base_dir / filename
@@ -1,27 +1,87 @@
 from __future__ import annotations
 
 from pathlib import Path
-from typing import Optional
+from typing import Any, List, Literal, Optional
 
 from pydantic import BaseModel
+from rich.console import Console
 
+from .archive import ArchivedLog, LogArchive, open_archive, relative_link
+from .cancellation import raise_if_cancelled
 from .config import AppConfig
-from .llm import LLMClient
 from .logs import extract_excerpt, extract_stack_summary
 from .models import (
+    CombinedReport,
     DebugRenderContext,
     DebugReport,
     LLMReport,
     RenderContext,
+    ReportSidecar,
 )
-from .renderer import render_markdown
+from .renderer import render_markdown, template_hash
+from .routing import analyze_log, request_report
+from .rules import match_rules
+from .schema import schema_prompts
+from .stacktrace import StackTrace, parse_stack_trace
+from .stats import stats
 from .storage import (
     ensure_project_dir,
-    next_bug_filename,
-    next_sequence_filename,
-    write_bug_file,
+    hash_payload,
+    reserve_report_files,
     write_report_file,
+    write_sidecar,
 )
+from .summarize import summarize_log
+from .usage import usage_scope
+
+console = Console()
+
+BUG_EXAMPLE: dict[str, Any] = {
+    "bug_title": "pytest: test_user_login 在无 token 环境下失败",
+    "severity": "high",
+    "expected": "在未登录时返回 401 并提示认证失败。",
+    "actual": "接口直接崩溃，返回 500。",
+    "probable_cause": "登录模块对缺失 token 的判断没有捕获异常。",
+    "reproduction_steps": [
+        "执行命令: pytest tests/test_login.py::test_user_login",
+        "确认环境变量 LOGIN_TOKEN 未设置",
+    ],
+    "log_excerpt": "AssertionError: Expected status 401 but got 500",
+    "stack_summary": "File tests/test_login.py, in test_user_login -> assert resp.status_code == 401",
+    "extra_notes": "建议检查最近合并的认证模块改动。",
+    "tags": ["登录", "后端"],
+}
+
+DEBUG_EXAMPLE: dict[str, Any] = {
+    "report_title": "调试记录：支付服务超时",
+    "initial_state": "CI 环境执行 nightly 构建时，支付接口稳定在线。",
+    "symptom_summary": "调用 `POST /payments` 时 60s 超时，日志出现 TimeoutError。",
+    "analysis_process": [
+        "复现问题：运行 `python services/payments/run.py`，确认 60s 超时。",
+        "检查最近提交：发现网络重试逻辑合并于 2024-05-12。",
+        "对比日志：重试已触发 3 次，实际请求未到达第三方沙箱。",
+    ],
+    "root_cause": "连接池配置错误，最长连接保持时间设为 5 秒导致频繁断开。",
+    "fix_steps": [
+        "更新 `config/default.yaml` 中的 `keepalive_timeout` 为 120。",
+        "部署补丁到 staging 并监控 10 分钟。",
+    ],
+    "verification": "在 staging 连续跑 20 次支付用例，全部成功且响应时间恢复至 1.2s。",
+    "lessons": "回归测试需覆盖连接池参数变更，必要时增加 smoke test。",
+    "extra_notes": "与 SRE 同步观察期至 2024-05-20。",
+}
+
+
+LOG_SUMMARY_HINT = "log_summary 为日志前段按行号分段的摘要，log_excerpt 为日志末尾原文，根因可能出现在前段。\n"
+
+
+def format_example(config: AppConfig, example: Any) -> str:
+    """输出格式由 JSON Schema 约束时省略示例，否则在提示词中给出示例 JSON。"""
+    if schema_prompts(config.llm):
+        return ""
+    import json
+
+    return f"示例：\n```json\n{json.dumps(example, ensure_ascii=False, indent=2)}\n```\n"
 
 
 class GenerationResult(BaseModel):
@@ -33,6 +93,7 @@ class GenerationResult(BaseModel):
     command: str
     file_path: Optional[Path]
     persisted: bool
+    fingerprint: Optional[str] = None
 
 
 class DebugGenerationResult(BaseModel):
@@ -44,6 +105,12 @@ class DebugGenerationResult(BaseModel):
     command: str
     file_path: Optional[Path]
     persisted: bool
+    fingerprint: Optional[str] = None
+
+
+class CombinedGenerationResult(BaseModel):
+    bug: GenerationResult
+    debug: DebugGenerationResult
 
 
 def build_messages(
@@ -53,6 +120,7 @@ def build_messages(
     log_excerpt: str,
     stack_summary: str,
     default_tags: Optional[str],
+    log_summary: Optional[str] = None,
 ) -> list[dict[str, str]]:
     import json
 
@@ -67,35 +135,11 @@ def build_messages(
         "log_excerpt": log_excerpt,
         "stack_summary": stack_summary,
         "default_tags": default_tags or "",
-        "expected_fields": [
-            "bug_title",
-            "severity",
-            "expected",
-            "actual",
-            "probable_cause",
-            "reproduction_steps",
-            "log_excerpt",
-            "stack_summary",
-            "extra_notes",
-            "tags",
-        ],
-    }
-
-    example = {
-        "bug_title": "pytest: test_user_login 在无 token 环境下失败",
-        "severity": "high",
-        "expected": "在未登录时返回 401 并提示认证失败。",
-        "actual": "接口直接崩溃，返回 500。",
-        "probable_cause": "登录模块对缺失 token 的判断没有捕获异常。",
-        "reproduction_steps": [
-            "执行命令: pytest tests/test_login.py::test_user_login",
-            "确认环境变量 LOGIN_TOKEN 未设置",
-        ],
-        "log_excerpt": "AssertionError: Expected status 401 but got 500",
-        "stack_summary": "File tests/test_login.py, in test_user_login -> assert resp.status_code == 401",
-        "extra_notes": "建议检查最近合并的认证模块改动。",
-        "tags": ["登录", "后端"],
     }
+    if not schema_prompts(config.llm):
+        user_payload["expected_fields"] = list(LLMReport.model_fields)
+    if log_summary:
+        user_payload["log_summary"] = log_summary
 
     return [
         {"role": "system", "content": system_prompt},
@@ -103,21 +147,25 @@ def build_messages(
             "role": "user",
             "content": (
                 "请严格输出 JSON，不要包含额外说明。\n"
-                f"示例：\n```json\n{json.dumps(example, ensure_ascii=False, indent=2)}\n```\n"
+                f"{LOG_SUMMARY_HINT if log_summary else ''}"
+                f"{format_example(config, BUG_EXAMPLE)}"
                 f"当前输入：```json\n{json.dumps(user_payload, ensure_ascii=False)}\n```"
             ),
         },
     ]
 
 
-def parse_llm_json(raw: str) -> LLMReport:
+def slice_json_object(raw: str) -> str:
+    """截取 LLM 输出中最外层的 JSON 对象文本。"""
     start = raw.find("{")
     end = raw.rfind("}")
     if start < 0 or end < 0 or end <= start:
         raise ValueError(f"未在 LLM 输出中找到 JSON：{raw}")
+    return raw[start : end + 1]
+
 
-    json_str = raw[start : end + 1]
-    return LLMReport.model_validate_json(json_str)
+def parse_llm_json(raw: str) -> LLMReport:
+    return LLMReport.model_validate_json(slice_json_object(raw))
 
 
 def build_debug_messages(
@@ -127,6 +175,7 @@ def build_debug_messages(
     environment: str,
     log_excerpt: str,
     stack_summary: str,
+    log_summary: Optional[str] = None,
 ) -> list[dict[str, str]]:
     import json
 
@@ -141,37 +190,11 @@ def build_debug_messages(
         "environment": environment,
         "log_excerpt": log_excerpt,
         "stack_summary": stack_summary,
-        "expected_fields": [
-            "report_title",
-            "initial_state",
-            "symptom_summary",
-            "analysis_process",
-            "root_cause",
-            "fix_steps",
-            "verification",
-            "lessons",
-            "extra_notes",
-        ],
-    }
-
-    example = {
-        "report_title": "调试记录：支付服务超时",
-        "initial_state": "CI 环境执行 nightly 构建时，支付接口稳定在线。",
-        "symptom_summary": "调用 `POST /payments` 时 60s 超时，日志出现 TimeoutError。",
-        "analysis_process": [
-            "复现问题：运行 `python services/payments/run.py`，确认 60s 超时。",
-            "检查最近提交：发现网络重试逻辑合并于 2024-05-12。",
-            "对比日志：重试已触发 3 次，实际请求未到达第三方沙箱。",
-        ],
-        "root_cause": "连接池配置错误，最长连接保持时间设为 5 秒导致频繁断开。",
-        "fix_steps": [
-            "更新 `config/default.yaml` 中的 `keepalive_timeout` 为 120。",
-            "部署补丁到 staging 并监控 10 分钟。",
-        ],
-        "verification": "在 staging 连续跑 20 次支付用例，全部成功且响应时间恢复至 1.2s。",
-        "lessons": "回归测试需覆盖连接池参数变更，必要时增加 smoke test。",
-        "extra_notes": "与 SRE 同步观察期至 2024-05-20。",
     }
+    if not schema_prompts(config.llm):
+        user_payload["expected_fields"] = list(DebugReport.model_fields)
+    if log_summary:
+        user_payload["log_summary"] = log_summary
 
     return [
         {"role": "system", "content": system_prompt},
@@ -179,7 +202,8 @@ def build_debug_messages(
             "role": "user",
             "content": (
                 "请严格输出 JSON，不要包含额外说明。\n"
-                f"示例：\n```json\n{json.dumps(example, ensure_ascii=False, indent=2)}\n```\n"
+                f"{LOG_SUMMARY_HINT if log_summary else ''}"
+                f"{format_example(config, DEBUG_EXAMPLE)}"
                 f"当前输入：```json\n{json.dumps(user_payload, ensure_ascii=False)}\n```"
             ),
         },
@@ -187,51 +211,76 @@ def build_debug_messages(
 
 
 def parse_debug_json(raw: str) -> DebugReport:
-    start = raw.find("{")
-    end = raw.rfind("}")
-    if start < 0 or end < 0 or end <= start:
-        raise ValueError(f"未在 LLM 输出中找到 JSON：{raw}")
+    return DebugReport.model_validate_json(slice_json_object(raw))
 
-    json_str = raw[start : end + 1]
-    return DebugReport.model_validate_json(json_str)
 
-
-def generate_bug_record(
-    *,
-    base_dir: Path,
+def build_combined_messages(
     config: AppConfig,
     project: str,
-    log_text: str,
     command: str,
     environment: str,
-    persist: bool = True,
-) -> GenerationResult:
-    excerpt = extract_excerpt(log_text)
-    stack_summary = extract_stack_summary(log_text)
+    log_excerpt: str,
+    stack_summary: str,
+    default_tags: Optional[str],
+    log_summary: Optional[str] = None,
+) -> list[dict[str, str]]:
+    """一次请求同时覆盖 Bug 与调试报告字段，日志片段只发送一份。"""
+    import json
 
-    messages = build_messages(
-        config=config,
-        project=project,
-        command=command,
-        log_excerpt=excerpt,
-        stack_summary=stack_summary,
-        default_tags=config.llm.prompt.default_tags,
+    system_prompt = (
+        config.llm.prompt.system
+        or "你是一名资深工程师，请根据日志同时生成缺陷报告与调试报告，合并输出为一个 JSON 对象。"
     )
 
-    client = LLMClient(config.llm)
-    raw_response = client.create_bug_report(messages)
-    report = parse_llm_json(raw_response)
+    user_payload = {
+        "project": project,
+        "command": command,
+        "environment": environment,
+        "log_excerpt": log_excerpt,
+        "stack_summary": stack_summary,
+        "default_tags": default_tags or "",
+    }
+    if not schema_prompts(config.llm):
+        user_payload["expected_fields"] = list(CombinedReport.model_fields)
+    if log_summary:
+        user_payload["log_summary"] = log_summary
+
+    return [
+        {"role": "system", "content": system_prompt},
+        {
+            "role": "user",
+            "content": (
+                "请严格输出 JSON，不要包含额外说明。\n"
+                f"{LOG_SUMMARY_HINT if log_summary else ''}"
+                f"{format_example(config, {**BUG_EXAMPLE, **DEBUG_EXAMPLE})}"
+                f"当前输入：```json\n{json.dumps(user_payload, ensure_ascii=False)}\n```"
+            ),
+        },
+    ]
+
+
+def parse_combined_json(raw: str) -> CombinedReport:
+    return CombinedReport.model_validate_json(slice_json_object(raw))
+
 
+def apply_default_tags(config: AppConfig, report: LLMReport) -> None:
     if config.llm.prompt.default_tags and not report.tags:
         report.tags = [
             tag.strip() for tag in config.llm.prompt.default_tags.split(",") if tag.strip()
         ]
 
-    vault_root = config.vault_root
-    project_dir = ensure_project_dir(vault_root, project)
-    sequence, filename = next_bug_filename(project_dir)
 
-    context = RenderContext(
+def build_render_context(
+    *,
+    report: LLMReport,
+    sequence: str,
+    project: str,
+    command: str,
+    environment: str,
+    excerpt: str,
+    stack_summary: str,
+) -> RenderContext:
+    return RenderContext(
         sequence=sequence,
         project=project,
         environment=environment,
@@ -241,21 +290,247 @@ def generate_bug_record(
         expected=report.expected,
         actual=report.actual,
         probable_cause=report.probable_cause,
-        log_excerpt=report.log_excerpt or excerpt,
-        stack_summary=report.stack_summary or stack_summary,
+        log_excerpt=excerpt,
+        stack_summary=stack_summary,
         extra_notes=report.extra_notes or "",
         tags=report.tags or [],
     )
 
-    template_path = config.resolve_template(base_dir)
-    markdown = render_markdown(template_path, context)
 
-    file_path: Optional[Path] = None
-    persisted = False
-    if persist:
-        write_bug_file(filename, markdown)
-        file_path = filename
-        persisted = True
+def build_debug_render_context(
+    *,
+    report: DebugReport,
+    sequence: str,
+    project: str,
+    command: str,
+    environment: str,
+    excerpt: str,
+    stack_summary: str,
+) -> DebugRenderContext:
+    return DebugRenderContext(
+        sequence=sequence,
+        project=project,
+        environment=environment,
+        command=command,
+        report_title=report.report_title,
+        initial_state=report.initial_state,
+        symptom_summary=report.symptom_summary,
+        analysis_process=report.analysis_process,
+        root_cause=report.root_cause,
+        fix_steps=report.fix_steps,
+        verification=report.verification,
+        lessons=report.lessons or "",
+        extra_notes=report.extra_notes or "",
+        log_excerpt=excerpt,
+        stack_summary=stack_summary,
+    )
+
+
+def generate_bug_record(
+    *,
+    base_dir: Path,
+    config: AppConfig,
+    project: str,
+    log_text: str,
+    command: str,
+    environment: str,
+    persist: bool = True,
+    force_llm: bool = False,
+) -> GenerationResult:
+    trace = parse_stack_trace(log_text)
+    excerpt = extract_excerpt(log_text)
+    stack_summary = extract_stack_summary(log_text, trace=trace)
+
+    report = (
+        None if force_llm else match_local_rules(base_dir, config, excerpt, command, trace)
+    )
+    if report is None:
+        messages = build_messages(
+            config=config,
+            project=project,
+            command=command,
+            log_excerpt=excerpt,
+            stack_summary=stack_summary,
+            default_tags=config.llm.prompt.default_tags,
+            log_summary=summarize_log(
+                base_dir=base_dir, config=config, project=project, log_text=log_text
+            ),
+        )
+        with usage_scope(
+            config.resolve_usage_ledger(base_dir),
+            project=project,
+            tool="bug_report",
+            log_chars=len(log_text),
+        ):
+            report = request_report(
+                config.llm,
+                messages,
+                parse_llm_json,
+                tool="bug_report",
+                features=analyze_log(excerpt, stack_summary, trace),
+                schema=LLMReport,
+            )
+
+    return finalize_bug_record(
+        base_dir=base_dir,
+        config=config,
+        project=project,
+        report=report,
+        command=command,
+        environment=environment,
+        excerpt=excerpt,
+        stack_summary=stack_summary,
+        persist=persist,
+        fingerprint=trace.fingerprint,
+        log_text=log_text,
+    )
+
+
+def archive_raw_log(
+    base_dir: Path, config: AppConfig, log_text: Optional[str]
+) -> Optional[ArchivedLog]:
+    """启用 [archive] 时归档完整原始日志；归档失败只告警，不影响报告生成。"""
+    if log_text is None:
+        return None
+    archive = open_archive(config, base_dir)
+    if archive is None:
+        return None
+    try:
+        archived = archive.store_text(log_text)
+    except Exception as exc:  # pylint: disable=broad-except
+        console.print(f"[yellow]原始日志归档失败：{exc}[/yellow]")
+        return None
+    stats.incr("archive.blobs_written" if archived.created else "archive.dedup_hits")
+    return archived
+
+
+def persist_report(
+    *,
+    path: Path,
+    markdown: str,
+    kind: Literal["bug", "debug"],
+    report: BaseModel,
+    context: BaseModel,
+    template_path: Path,
+    excerpt: str,
+    stack_summary: str,
+    raw_log: Optional[ArchivedLog] = None,
+    reserved: bool = False,
+) -> bool:
+    """写入 Markdown，并在其旁写入 JSON 侧文件（已存在的报告不覆盖）。
+
+    path 为 reserve_report_files 占用的文件名时传入 reserved=True。
+    传入 raw_log 时同时登记归档引用，供 GC 计算引用计数。返回报告是否实际写入。
+    """
+    raise_if_cancelled()
+    label = "Bug" if kind == "bug" else "调试"
+    if not write_report_file(path, markdown, label=label, reserved=reserved):
+        return False
+
+    context_data = context.model_dump(mode="json")
+    sidecar = ReportSidecar(
+        kind=kind,
+        report=report.model_dump(mode="json"),
+        context=context_data,
+        template_hash=template_hash(template_path),
+        context_hash=hash_payload(context_data),
+        log_excerpt=excerpt,
+        stack_summary=stack_summary,
+    )
+    write_sidecar(path, sidecar.model_dump(mode="json"))
+    if raw_log is not None:
+        LogArchive(raw_log.archive_dir).add_reference(raw_log.digest, path)
+    return True
+
+
+def match_local_rules(
+    base_dir: Path,
+    config: AppConfig,
+    excerpt: str,
+    command: str,
+    trace: Optional[StackTrace] = None,
+) -> Optional[LLMReport]:
+    """本地规则快速路径：命中且置信度达标时直接返回报告，无需调用 LLM。
+
+    trace 为完整日志的堆栈解析结果，用于确认规则命中的是最终异常；未提供时从摘录解析。
+    """
+    if not config.rules.enabled:
+        return None
+    match = match_rules(
+        excerpt,
+        command,
+        config.resolve_rules_dir(base_dir),
+        config.rules.confidence_threshold,
+        trace,
+    )
+    if match is None:
+        return None
+    stats.incr(f"rules.{match.rule}.hits")
+    return match.report
+
+
+def finalize_bug_record(
+    *,
+    base_dir: Path,
+    config: AppConfig,
+    project: str,
+    report: LLMReport,
+    command: str,
+    environment: str,
+    excerpt: str,
+    stack_summary: str,
+    persist: bool = True,
+    fingerprint: Optional[str] = None,
+    log_text: Optional[str] = None,
+    affected_tests: Optional[List[str]] = None,
+) -> GenerationResult:
+    """补全默认标签、分配序号、渲染并（可选）写入 bugNNN.md。
+
+    提供 log_text 且启用归档时，完整日志写入归档并在报告中链接。
+    """
+    # MCP 客户端已取消时不再渲染与写盘
+    raise_if_cancelled()
+    apply_default_tags(config, report)
+
+    vault_root = config.vault_root
+    project_dir = ensure_project_dir(vault_root, project)
+    with reserve_report_files(project_dir, ("bug",), reserve=persist) as (sequence, filenames):
+        filename = filenames["bug"]
+
+        context = build_render_context(
+            report=report,
+            sequence=sequence,
+            project=project,
+            command=command,
+            environment=environment,
+            excerpt=excerpt,
+            stack_summary=stack_summary,
+        )
+        if affected_tests:
+            context.affected_tests = list(affected_tests)
+        raw_log = archive_raw_log(base_dir, config, log_text) if persist else None
+        if raw_log is not None:
+            context.raw_log = relative_link(raw_log, filename)
+
+        template_path = config.resolve_template(base_dir)
+        markdown = render_markdown(template_path, context)
+
+        file_path: Optional[Path] = None
+        persisted = False
+        if persist:
+            persisted = persist_report(
+                path=filename,
+                markdown=markdown,
+                kind="bug",
+                report=report,
+                context=context,
+                template_path=template_path,
+                excerpt=excerpt,
+                stack_summary=stack_summary,
+                raw_log=raw_log,
+                reserved=True,
+            )
+            file_path = filename if persisted else None
 
     return GenerationResult(
         project=project,
@@ -266,6 +541,7 @@ def generate_bug_record(
         command=command,
         file_path=file_path,
         persisted=persisted,
+        fingerprint=fingerprint,
     )
 
 
@@ -279,8 +555,9 @@ def generate_debug_record(
     environment: str,
     persist: bool = True,
 ) -> DebugGenerationResult:
+    trace = parse_stack_trace(log_text)
     excerpt = extract_excerpt(log_text)
-    stack_summary = extract_stack_summary(log_text)
+    stack_summary = extract_stack_summary(log_text, trace=trace)
 
     messages = build_debug_messages(
         config=config,
@@ -289,43 +566,64 @@ def generate_debug_record(
         environment=environment,
         log_excerpt=excerpt,
         stack_summary=stack_summary,
+        log_summary=summarize_log(
+            base_dir=base_dir, config=config, project=project, log_text=log_text
+        ),
     )
 
-    client = LLMClient(config.llm)
-    raw_response = client.create_bug_report(messages)
-    report = parse_debug_json(raw_response)
-
+    with usage_scope(
+        config.resolve_usage_ledger(base_dir),
+        project=project,
+        tool="debug_report",
+        log_chars=len(log_text),
+    ):
+        report = request_report(
+            config.llm,
+            messages,
+            parse_debug_json,
+            tool="debug_report",
+            features=analyze_log(excerpt, stack_summary, trace),
+            schema=DebugReport,
+        )
+
+    raise_if_cancelled()
     vault_root = config.vault_root
     project_dir = ensure_project_dir(vault_root, project)
-    sequence, filename = next_sequence_filename(project_dir, "debug")
-
-    context = DebugRenderContext(
-        sequence=sequence,
-        project=project,
-        environment=environment,
-        command=command,
-        report_title=report.report_title,
-        initial_state=report.initial_state,
-        symptom_summary=report.symptom_summary,
-        analysis_process=report.analysis_process,
-        root_cause=report.root_cause,
-        fix_steps=report.fix_steps,
-        verification=report.verification,
-        lessons=report.lessons or "",
-        extra_notes=report.extra_notes or "",
-        log_excerpt=excerpt,
-        stack_summary=stack_summary,
-    )
-
-    template_path = config.resolve_debug_template(base_dir)
-    markdown = render_markdown(template_path, context)
-
-    file_path: Optional[Path] = None
-    persisted = False
-    if persist:
-        write_report_file(filename, markdown, label="调试")
-        file_path = filename
-        persisted = True
+    with reserve_report_files(project_dir, ("debug",), reserve=persist) as (sequence, filenames):
+        filename = filenames["debug"]
+
+        context = build_debug_render_context(
+            report=report,
+            sequence=sequence,
+            project=project,
+            command=command,
+            environment=environment,
+            excerpt=excerpt,
+            stack_summary=stack_summary,
+        )
+        raw_log = archive_raw_log(base_dir, config, log_text) if persist else None
+        if raw_log is not None:
+            context.raw_log = relative_link(raw_log, filename)
+
+        template_path = config.resolve_debug_template(base_dir)
+        markdown = render_markdown(template_path, context)
+
+        file_path: Optional[Path] = None
+        persisted = False
+        if persist:
+            persisted = persist_report(
+                path=filename,
+                markdown=markdown,
+                kind="debug",
+                report=report,
+                context=context,
+                template_path=template_path,
+                excerpt=excerpt,
+                stack_summary=stack_summary,
+                raw_log=raw_log,
+                reserved=True,
+            )
+            file_path = filename if persisted else None
 
     return DebugGenerationResult(
         project=project,
@@ -336,4 +634,138 @@ def generate_debug_record(
         command=command,
         file_path=file_path,
         persisted=persisted,
+        fingerprint=trace.fingerprint,
+    )
+
+
+def generate_combined_record(
+    *,
+    base_dir: Path,
+    config: AppConfig,
+    project: str,
+    log_text: str,
+    command: str,
+    environment: str,
+    persist: bool = True,
+) -> CombinedGenerationResult:
+    """单次 LLM 调用同时生成 bugNNN.md 与 debugNNN.md，两者共享同一序号。"""
+    trace = parse_stack_trace(log_text)
+    excerpt = extract_excerpt(log_text)
+    stack_summary = extract_stack_summary(log_text, trace=trace)
+
+    messages = build_combined_messages(
+        config=config,
+        project=project,
+        command=command,
+        environment=environment,
+        log_excerpt=excerpt,
+        stack_summary=stack_summary,
+        default_tags=config.llm.prompt.default_tags,
+        log_summary=summarize_log(
+            base_dir=base_dir, config=config, project=project, log_text=log_text
+        ),
+    )
+
+    with usage_scope(
+        config.resolve_usage_ledger(base_dir),
+        project=project,
+        tool="bug_debug_report",
+        log_chars=len(log_text),
+    ):
+        combined = request_report(
+            config.llm,
+            messages,
+            parse_combined_json,
+            tool="bug_debug_report",
+            features=analyze_log(excerpt, stack_summary, trace),
+            schema=CombinedReport,
+        )
+    raise_if_cancelled()
+    bug_report = combined.to_bug_report()
+    debug_report = combined.to_debug_report()
+    apply_default_tags(config, bug_report)
+
+    project_dir = ensure_project_dir(config.vault_root, project)
+    with reserve_report_files(project_dir, ("bug", "debug"), reserve=persist) as (
+        sequence,
+        filenames,
+    ):
+        bug_context = build_render_context(
+            report=bug_report,
+            sequence=sequence,
+            project=project,
+            command=command,
+            environment=environment,
+            excerpt=excerpt,
+            stack_summary=stack_summary,
+        )
+        debug_context = build_debug_render_context(
+            report=debug_report,
+            sequence=sequence,
+            project=project,
+            command=command,
+            environment=environment,
+            excerpt=excerpt,
+            stack_summary=stack_summary,
+        )
+        raw_log = archive_raw_log(base_dir, config, log_text) if persist else None
+        if raw_log is not None:
+            bug_context.raw_log = relative_link(raw_log, filenames["bug"])
+            debug_context.raw_log = relative_link(raw_log, filenames["debug"])
+
+        bug_template = config.resolve_template(base_dir)
+        debug_template = config.resolve_debug_template(base_dir)
+        bug_markdown = render_markdown(bug_template, bug_context)
+        debug_markdown = render_markdown(debug_template, debug_context)
+
+        bug_persisted = debug_persisted = False
+        if persist:
+            bug_persisted = persist_report(
+                path=filenames["bug"],
+                markdown=bug_markdown,
+                kind="bug",
+                report=bug_report,
+                context=bug_context,
+                template_path=bug_template,
+                excerpt=excerpt,
+                stack_summary=stack_summary,
+                raw_log=raw_log,
+                reserved=True,
+            )
+            debug_persisted = persist_report(
+                path=filenames["debug"],
+                markdown=debug_markdown,
+                kind="debug",
+                report=debug_report,
+                context=debug_context,
+                template_path=debug_template,
+                excerpt=excerpt,
+                stack_summary=stack_summary,
+                raw_log=raw_log,
+                reserved=True,
+            )
+
+    return CombinedGenerationResult(
+        bug=GenerationResult(
+            project=project,
+            sequence=sequence,
+            markdown=bug_markdown,
+            report=bug_report,
+            environment=environment,
+            command=command,
+            file_path=filenames["bug"] if bug_persisted else None,
+            persisted=bug_persisted,
+            fingerprint=trace.fingerprint,
+        ),
+        debug=DebugGenerationResult(
+            project=project,
+            sequence=sequence,
+            markdown=debug_markdown,
+            report=debug_report,
+            environment=environment,
+            command=command,
+            file_path=filenames["debug"] if debug_persisted else None,
+            persisted=debug_persisted,
+            fingerprint=trace.fingerprint,
+        ),
     )
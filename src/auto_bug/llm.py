@@ -1,12 +1,23 @@
 from __future__ import annotations
 
+import asyncio
+import contextlib
 import json
-from typing import Any, Dict, List
+import time
+from typing import Any, Dict, List, Optional, Tuple, Type
 
 import httpx
+from pydantic import BaseModel
 from rich.console import Console
 
+from .cancellation import CancelToken, RequestCancelled, current_cancel_token
+from .cassette import open_cassette
 from .config import LLMConfig, get_api_key
+from .logs import estimate_tokens
+from .ratelimit import scheduler
+from .schema import reject_json_schema, response_format
+from .stats import stats
+from .usage import parse_usage, record_call
 
 console = Console()
 
@@ -14,7 +25,10 @@ console = Console()
 class LLMClient:
     def __init__(self, config: LLMConfig):
         self.config = config
-        self.api_key = get_api_key(config.api_key_env)
+        self.cassette = open_cassette(config.cassette)
+        # 回放模式不访问网络，无需 API Key
+        replaying = self.cassette is not None and self.cassette.replaying
+        self.api_key = "" if replaying else get_api_key(config.api_key_env)
 
     def _build_headers(self) -> Dict[str, str]:
         if self.config.provider == "openai":
@@ -38,32 +52,162 @@ class LLMClient:
             return "https://api.deepseek.com/v1/chat/completions"
         raise ValueError(f"未知 provider: {self.config.provider}")
 
-    def create_bug_report(self, messages: List[Dict[str, str]]) -> str:
+    def create_bug_report(
+        self, messages: List[Dict[str, str]], schema: Optional[Type[BaseModel]] = None
+    ) -> str:
+        """schema 为期望的输出模型；provider 支持时以严格 JSON Schema 约束输出，否则退回 json_object。"""
+        output_format = response_format(schema, self.config)
         payload = {
             "model": self.config.model,
             "messages": messages,
             "temperature": 0.2,
-            "response_format": {"type": "json_object"},
+            "response_format": output_format,
         }
+        stats.incr(f"llm.response_format.{output_format['type']}")
 
-        endpoint = self._endpoint()
-        headers = self._build_headers()
-
-        console.log(f"调用 LLM: provider={self.config.provider}, model={self.config.model}")
+        if self.cassette is not None and self.cassette.replaying:
+            return self._content(self.cassette.replay(self.config.provider, payload))
 
-        with httpx.Client(timeout=self.config.timeout) as client:
-            response = client.post(endpoint, headers=headers, content=json.dumps(payload))
+        response, started = self._send(messages, payload)
+        if self._rejects_json_schema(output_format, response):
+            # auto 模式下端点或模型不支持 json_schema：记住后以 json_object 重试一次
+            self._record(f"http_{response.status_code}", started)
+            reject_json_schema(self.config)
+            console.print(
+                f"[yellow]{self.config.model} 不支持 json_schema，改用 json_object 重试[/yellow]"
+            )
+            stats.incr("llm.response_format.fallback")
+            stats.incr("llm.response_format.json_object")
+            payload = {**payload, "response_format": {"type": "json_object"}}
+            response, started = self._send(messages, payload)
 
         if response.status_code >= 400:
+            self._record(f"http_{response.status_code}", started)
             raise RuntimeError(
                 f"LLM 请求失败：{response.status_code} {response.text[:200]}"
             )
 
         data = response.json()
+        prompt_tokens, completion_tokens, cached_tokens = parse_usage(data)
+        self._record("ok", started, prompt_tokens, completion_tokens, cached_tokens)
+        content = self._content(data)
+        if self.cassette is not None and self.cassette.recording:
+            self.cassette.record(
+                self.config.provider, payload, data, time.perf_counter() - started
+            )
+        return content
+
+    def _send(
+        self, messages: List[Dict[str, str]], payload: Dict[str, Any]
+    ) -> Tuple[httpx.Response, float]:
+        """经调度器限流后发送一次请求，返回响应与开始时间。"""
+        endpoint = self._endpoint()
+        headers = self._build_headers()
+
+        limits = self.config.rate_limit
+        prompt_tokens = sum(estimate_tokens(message["content"]) for message in messages)
+        scheduler.acquire(
+            self.config.provider,
+            self.config.model,
+            prompt_tokens + limits.completion_tokens_estimate,
+            limits,
+        )
+
+        console.log(f"调用 LLM: provider={self.config.provider}, model={self.config.model}")
+
+        started = time.perf_counter()
+        try:
+            response = self._post(endpoint, headers, payload)
+        except RequestCancelled:
+            self._record("cancelled", started)
+            self._observe_abort(time.perf_counter() - started)
+            raise
+        except httpx.HTTPError:
+            self._record("transport_error", started)
+            raise
+        stats.observe(f"llm.http.{self.config.model}", time.perf_counter() - started)
+        return response, started
+
+    def _rejects_json_schema(
+        self, output_format: Dict[str, Any], response: httpx.Response
+    ) -> bool:
+        """仅 auto 模式回退：显式配置 json_schema 时 400 原样报错。"""
+        if self.config.structured_output != "auto" or output_format["type"] != "json_schema":
+            return False
+        if response.status_code != 400:
+            return False
+        text = response.text
+        return "response_format" in text or "json_schema" in text
+
+    def _post(
+        self, endpoint: str, headers: Dict[str, str], payload: Dict[str, Any]
+    ) -> httpx.Response:
+        token = current_cancel_token()
+        if token is None:
+            with httpx.Client(timeout=self.config.timeout) as client:
+                return client.post(endpoint, headers=headers, content=json.dumps(payload))
+        token.raise_if_cancelled()
+        # 可取消的请求走异步客户端：取消时直接中断连接，而不是等待响应返回
+        return asyncio.run(self._post_cancellable(endpoint, headers, payload, token))
+
+    async def _post_cancellable(
+        self,
+        endpoint: str,
+        headers: Dict[str, str],
+        payload: Dict[str, Any],
+        token: CancelToken,
+    ) -> httpx.Response:
+        loop = asyncio.get_running_loop()
+        cancelled = loop.create_future()
+
+        def wake() -> None:
+            loop.call_soon_threadsafe(lambda: cancelled.done() or cancelled.set_result(None))
+
+        token.add_callback(wake)
+        try:
+            async with httpx.AsyncClient(timeout=self.config.timeout) as client:
+                request = asyncio.ensure_future(
+                    client.post(endpoint, headers=headers, content=json.dumps(payload))
+                )
+                await asyncio.wait({request, cancelled}, return_when=asyncio.FIRST_COMPLETED)
+                if request.done():
+                    return request.result()
+                request.cancel()
+                with contextlib.suppress(asyncio.CancelledError):
+                    await request
+                raise RequestCancelled("客户端已取消请求，LLM 调用已中断")
+        finally:
+            token.remove_callback(wake)
+
+    def _observe_abort(self, elapsed: float) -> None:
+        """按同模型成功请求的平均耗时估算本次中断节省的时间。"""
+        stats.incr("cancellation.llm_aborted")
+        typical = stats.mean(f"llm.http.{self.config.model}")
+        if typical is not None:
+            stats.observe("cancellation.freed", max(0.0, typical - elapsed))
+
+    @staticmethod
+    def _content(data: Dict[str, Any]) -> str:
         # OpenAI / DeepSeek 类似结构：choices[0].message.content
         try:
-            content = data["choices"][0]["message"]["content"]
+            return data["choices"][0]["message"]["content"]
         except (KeyError, IndexError) as exc:
             raise RuntimeError(f"解析 LLM 响应失败：{data}") from exc
 
-        return content
+    def _record(
+        self,
+        status: str,
+        started: float,
+        prompt_tokens: int = 0,
+        completion_tokens: int = 0,
+        cached_tokens: int = 0,
+    ) -> None:
+        record_call(
+            provider=self.config.provider,
+            model=self.config.model,
+            status=status,
+            latency=time.perf_counter() - started,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            cached_tokens=cached_tokens,
+        )
@@ -0,0 +1,484 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import AsyncExitStack
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from pydantic import BaseModel, Field
+from rich.console import Console
+from rich.table import Table
+
+try:
+    from mcp import ClientSession, StdioServerParameters
+    from mcp.client.sse import sse_client
+    from mcp.client.stdio import stdio_client
+except ImportError as exc:  # pragma: no cover
+    raise ImportError(
+        "缺少 mcp[cli] 依赖，请执行 `pip install '.[mcp]'` 后再运行压测。"
+    ) from exc
+
+console = Console()
+
+API_KEY_ENV = "AUTO_BUG_LOADTEST_API_KEY"
+
+SAMPLE_LOG = """Traceback (most recent call last):
+  File "/srv/app/orders.py", line 48, in <module>
+    main()
+  File "/srv/app/orders.py", line 42, in main
+    total = calc_total(orders)
+  File "/srv/app/orders.py", line 30, in calc_total
+    total += order["amount"]
+TypeError: unsupported operand type(s) for +=: 'float' and 'str'
+"""
+
+STUB_REPORT = {
+    "bug_title": "压测：订单金额类型错误",
+    "severity": "medium",
+    "expected": "订单金额累加成功。",
+    "actual": "累加时抛出 TypeError。",
+    "probable_cause": "amount 字段为字符串。",
+    "reproduction_steps": ["python orders.py"],
+    "tags": ["loadtest"],
+    "report_title": "压测调试记录",
+    "root_cause": "amount 字段为字符串。",
+}
+
+# 各工具在 --persist 时应为每次成功调用写出的报告前缀
+TOOL_PREFIXES = {
+    "bug_report": ("bug",),
+    "debug_report": ("debug",),
+    "bug_debug_report": ("bug", "debug"),
+}
+
+
+class LoadTestResult(BaseModel):
+    transport: str
+    tool: str
+    concurrency: int
+    rate: float
+    requests: int
+    errors: int
+    error_rate: float
+    duration_seconds: float
+    throughput: float
+    latency_p50: float
+    latency_p95: float
+    latency_p99: float
+    latency_max: float
+    rss_peak_mb: Optional[float] = None
+    rss_samples: List[tuple[float, float]] = Field(default_factory=list)
+    # 仅 --persist 时统计：各前缀实际写出的报告数，与成功调用数不一致说明有报告丢失
+    persisted_files: Dict[str, int] = Field(default_factory=dict)
+    persist_mismatch: List[str] = Field(default_factory=list)
+
+
+def _stub_handler(latency: float) -> type[BaseHTTPRequestHandler]:
+    body = json.dumps(
+        {
+            "choices": [{"message": {"content": json.dumps(STUB_REPORT, ensure_ascii=False)}}],
+            "usage": {"prompt_tokens": 800, "completion_tokens": 200},
+        }
+    ).encode("utf-8")
+
+    class StubLLMHandler(BaseHTTPRequestHandler):
+        def do_POST(self) -> None:  # noqa: N802
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if latency:
+                time.sleep(latency)
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args: Any) -> None:
+            pass
+
+    return StubLLMHandler
+
+
+def start_stub_llm(latency: float) -> ThreadingHTTPServer:
+    """本地 OpenAI 兼容桩服务，固定返回报告 JSON，用于隔离真实 LLM。"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _stub_handler(latency))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def write_config(workdir: Path, stub_port: int, templates_dir: Path) -> Path:
+    config_file = workdir / "config.toml"
+    vault = workdir / "vault"
+    templates_dir = templates_dir.resolve()
+    config_file.write_text(
+        f'vault_root = "{vault.as_posix()}"\n'
+        'default_project = "loadtest"\n'
+        f'template_path = "{(templates_dir / "bug_report.md.j2").as_posix()}"\n'
+        f'debug_template_path = "{(templates_dir / "debug_report.md.j2").as_posix()}"\n\n'
+        "[rules]\nenabled = false\n\n"
+        "[llm]\n"
+        'provider = "openai"\n'
+        'model = "stub"\n'
+        f'api_key_env = "{API_KEY_ENV}"\n'
+        f'api_base = "http://127.0.0.1:{stub_port}/v1/chat/completions"\n',
+        encoding="utf-8",
+    )
+    return config_file
+
+
+def read_rss_mb(pid: int) -> Optional[float]:
+    """读取 /proc/<pid>/status 中的 VmRSS（仅 Linux）。"""
+    try:
+        with open(f"/proc/{pid}/status", encoding="utf-8") as fp:
+            for line in fp:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+
+def find_child_server_pid() -> Optional[int]:
+    """stdio 模式下服务进程由 MCP 客户端拉起，按父进程号与命令行查找。"""
+    me = os.getpid()
+    proc = Path("/proc")
+    if not proc.exists():
+        return None
+    for entry in proc.iterdir():
+        if not entry.name.isdigit():
+            continue
+        try:
+            stat = (entry / "stat").read_text()
+            cmdline = (entry / "cmdline").read_bytes()
+        except OSError:
+            continue
+        ppid = int(stat.rsplit(")", 1)[1].split()[1])
+        if ppid == me and b"auto_bug.mcp_server" in cmdline:
+            return int(entry.name)
+    return None
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[idx]
+
+
+async def _sample_rss(
+    pid_getter: Callable[[], Optional[int]],
+    samples: List[tuple[float, float]],
+    interval: float,
+    started: float,
+) -> None:
+    while True:
+        pid = pid_getter()
+        rss = read_rss_mb(pid) if pid else None
+        if rss is not None:
+            samples.append((round(time.perf_counter() - started, 2), round(rss, 1)))
+        await asyncio.sleep(interval)
+
+
+async def _wait_for_sse(url: str, process: subprocess.Popen[bytes], timeout: float = 20.0) -> None:
+    import httpx
+
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError("MCP 服务进程提前退出")
+            try:
+                async with client.stream("GET", url, timeout=1.0) as response:
+                    if response.status_code == 200:
+                        return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"等待 MCP 服务启动超时：{url}")
+
+
+async def run_load_test(
+    *,
+    transport: str,
+    tool: str,
+    concurrency: int,
+    requests: int,
+    rate: float,
+    llm_latency: float,
+    log_text: str,
+    persist: bool,
+    port: int,
+    sessions: int,
+    rss_interval: float,
+    templates_dir: Path,
+    keep_workdir: bool = False,
+) -> LoadTestResult:
+    """对 auto-bug MCP 服务发起并发调用，LLM 由本地桩服务替代。
+
+    rate > 0 时为开环模式（按泊松到达发起请求，受 concurrency 上限约束）；
+    rate == 0 时为闭环模式（concurrency 个 worker 连续发起请求）。
+    工作目录（Vault、用量账本等）在结束时删除，keep_workdir=True 时保留以便排查。
+    """
+    stub = start_stub_llm(llm_latency)
+    env = {**os.environ, API_KEY_ENV: "loadtest"}
+    server_cmd = [sys.executable, "-m", "auto_bug.mcp_server", "--transport", transport]
+
+    latencies: List[float] = []
+    errors = 0
+    rss_samples: List[tuple[float, float]] = []
+    persisted_files: Dict[str, int] = {}
+
+    async with AsyncExitStack() as stack:
+        # 最先注册，最后清理：服务进程退出之后再删除工作目录
+        if keep_workdir:
+            workdir = Path(tempfile.mkdtemp(prefix="auto-bug-loadtest-"))
+            console.print(f"保留工作目录：{workdir}")
+        else:
+            workdir = Path(
+                stack.enter_context(tempfile.TemporaryDirectory(prefix="auto-bug-loadtest-"))
+            )
+        config_file = write_config(workdir, stub.server_port, templates_dir)
+        arguments = {
+            "log_text": log_text,
+            "project": "loadtest",
+            "command": "loadtest",
+            "persist": persist,
+            "config_path": str(config_file),
+        }
+        process: Optional[subprocess.Popen[bytes]] = None
+        client_sessions: List[ClientSession] = []
+        if transport == "sse":
+            process = subprocess.Popen(
+                [*server_cmd, "--port", str(port)],
+                env=env,
+                cwd=workdir,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+            stack.callback(process.wait)
+            stack.callback(process.terminate)
+            url = f"http://127.0.0.1:{port}/sse"
+            await _wait_for_sse(url, process)
+            for _ in range(max(1, min(sessions, concurrency))):
+                read, write = await stack.enter_async_context(sse_client(url))
+                session = await stack.enter_async_context(ClientSession(read, write))
+                await session.initialize()
+                client_sessions.append(session)
+            pid_getter = lambda: process.pid  # noqa: E731
+        else:
+            params = StdioServerParameters(
+                command=server_cmd[0], args=server_cmd[1:], env=env, cwd=str(workdir)
+            )
+            errlog = stack.enter_context(open(os.devnull, "w", encoding="utf-8"))
+            read, write = await stack.enter_async_context(stdio_client(params, errlog=errlog))
+            session = await stack.enter_async_context(ClientSession(read, write))
+            await session.initialize()
+            client_sessions.append(session)
+            server_pid = find_child_server_pid()
+            pid_getter = lambda: server_pid  # noqa: E731
+
+        started = time.perf_counter()
+        sampler = asyncio.create_task(_sample_rss(pid_getter, rss_samples, rss_interval, started))
+        limit = asyncio.Semaphore(concurrency)
+
+        async def one_call(index: int) -> None:
+            nonlocal errors
+            session = client_sessions[index % len(client_sessions)]
+            call_started = time.perf_counter()
+            try:
+                result = await session.call_tool(tool, arguments)
+                if result.isError:
+                    errors += 1
+            except Exception:  # pylint: disable=broad-except
+                errors += 1
+            latencies.append(time.perf_counter() - call_started)
+
+        async def limited(index: int) -> None:
+            async with limit:
+                await one_call(index)
+
+        tasks = []
+        for index in range(requests):
+            tasks.append(asyncio.create_task(limited(index)))
+            if rate > 0:
+                await asyncio.sleep(random.expovariate(rate))
+        await asyncio.gather(*tasks)
+
+        duration = time.perf_counter() - started
+        sampler.cancel()
+        if persist:
+            project_dir = workdir / "vault" / "loadtest"
+            for prefix in TOOL_PREFIXES[tool]:
+                persisted_files[prefix] = sum(
+                    1
+                    for path in project_dir.glob(f"{prefix}*.md")
+                    if path.stem[len(prefix) :].isdigit() and path.stat().st_size > 0
+                )
+
+    stub.shutdown()
+    peak = max((rss for _, rss in rss_samples), default=None)
+    succeeded = requests - errors
+    mismatch = [
+        f"{prefix}: 成功调用 {succeeded} 次，写出 {count} 份报告"
+        for prefix, count in persisted_files.items()
+        if count != succeeded
+    ]
+    return LoadTestResult(
+        transport=transport,
+        tool=tool,
+        concurrency=concurrency,
+        rate=rate,
+        requests=requests,
+        errors=errors,
+        error_rate=round(errors / requests, 4) if requests else 0.0,
+        duration_seconds=round(duration, 3),
+        throughput=round(requests / duration, 3) if duration else 0.0,
+        latency_p50=round(percentile(latencies, 50), 4),
+        latency_p95=round(percentile(latencies, 95), 4),
+        latency_p99=round(percentile(latencies, 99), 4),
+        latency_max=round(max(latencies, default=0.0), 4),
+        rss_peak_mb=peak,
+        rss_samples=rss_samples,
+        persisted_files=persisted_files,
+        persist_mismatch=mismatch,
+    )
+
+
+def compare_baseline(result: LoadTestResult, baseline: LoadTestResult, tolerance: float) -> List[str]:
+    """返回相对基线的回退项；为空表示通过。"""
+    regressions: List[str] = []
+    for name in ("latency_p50", "latency_p95", "latency_p99"):
+        current, previous = getattr(result, name), getattr(baseline, name)
+        if previous and current > previous * (1 + tolerance):
+            regressions.append(f"{name}: {previous:.4f}s -> {current:.4f}s")
+    if baseline.throughput and result.throughput < baseline.throughput * (1 - tolerance):
+        regressions.append(f"throughput: {baseline.throughput:.2f}/s -> {result.throughput:.2f}/s")
+    if result.error_rate > baseline.error_rate + 0.01:
+        regressions.append(f"error_rate: {baseline.error_rate:.2%} -> {result.error_rate:.2%}")
+    if (
+        baseline.rss_peak_mb
+        and result.rss_peak_mb
+        and result.rss_peak_mb > baseline.rss_peak_mb * (1 + tolerance)
+    ):
+        regressions.append(f"rss_peak_mb: {baseline.rss_peak_mb:.1f} -> {result.rss_peak_mb:.1f}")
+    return regressions
+
+
+def print_result(result: LoadTestResult) -> None:
+    table = Table(title=f"auto-bug MCP 压测（{result.transport} / {result.tool}）")
+    table.add_column("指标")
+    table.add_column("值")
+    rows: Dict[str, str] = {
+        "请求数": str(result.requests),
+        "并发 / 到达率": f"{result.concurrency} / {result.rate or '闭环'}",
+        "耗时": f"{result.duration_seconds:.2f}s",
+        "吞吐": f"{result.throughput:.2f} req/s",
+        "p50 / p95 / p99": (
+            f"{result.latency_p50 * 1000:.0f} / {result.latency_p95 * 1000:.0f} / "
+            f"{result.latency_p99 * 1000:.0f} ms"
+        ),
+        "错误率": f"{result.error_rate:.2%}",
+        "RSS 峰值": f"{result.rss_peak_mb:.1f} MB" if result.rss_peak_mb else "未知",
+    }
+    if result.persisted_files:
+        rows["写出报告"] = ", ".join(
+            f"{prefix} {count}" for prefix, count in result.persisted_files.items()
+        )
+    for key, value in rows.items():
+        table.add_row(key, value)
+    console.print(table)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="auto-bug MCP 并发压测（LLM 由本地桩服务替代）")
+    parser.add_argument("--transport", choices=["stdio", "sse"], default="sse")
+    parser.add_argument(
+        "--tool", choices=["bug_report", "debug_report", "bug_debug_report"], default="bug_report"
+    )
+    parser.add_argument("--concurrency", type=int, default=8, help="同时在途的最大请求数")
+    parser.add_argument("--requests", type=int, default=200, help="请求总数")
+    parser.add_argument(
+        "--rate", type=float, default=0.0, help="到达率（req/s，泊松分布）；0 表示闭环"
+    )
+    parser.add_argument(
+        "--llm-latency", type=float, default=0.2, help="桩 LLM 每次响应的模拟延迟（秒）"
+    )
+    parser.add_argument(
+        "--log-file", type=Path, help="作为 log_text 发送的日志文件，默认使用内置样例"
+    )
+    parser.add_argument(
+        "--persist",
+        action="store_true",
+        help="写入报告文件（默认仅渲染），并校验写出的报告数与成功调用数一致",
+    )
+    parser.add_argument(
+        "--keep-workdir", action="store_true", help="保留临时工作目录（Vault、用量账本）以便排查"
+    )
+    parser.add_argument("--port", type=int, default=18001, help="sse 模式下服务监听端口")
+    parser.add_argument("--sessions", type=int, default=4, help="sse 模式下建立的 MCP 会话数")
+    parser.add_argument("--rss-interval", type=float, default=0.5, help="RSS 采样间隔（秒）")
+    parser.add_argument(
+        "--templates-dir", type=Path, default=Path("templates"), help="报告模板目录（默认 ./templates）"
+    )
+    parser.add_argument("--output", type=Path, help="结果 JSON 输出路径")
+    parser.add_argument("--save-baseline", type=Path, help="将本次结果保存为基线")
+    parser.add_argument("--baseline", type=Path, help="与基线比较，超出容差时以非零状态退出")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="允许的相对回退比例")
+    args = parser.parse_args()
+
+    log_text = args.log_file.read_text(encoding="utf-8") if args.log_file else SAMPLE_LOG
+    result = asyncio.run(
+        run_load_test(
+            transport=args.transport,
+            tool=args.tool,
+            concurrency=args.concurrency,
+            requests=args.requests,
+            rate=args.rate,
+            llm_latency=args.llm_latency,
+            log_text=log_text,
+            persist=args.persist,
+            port=args.port,
+            sessions=args.sessions,
+            rss_interval=args.rss_interval,
+            templates_dir=args.templates_dir,
+            keep_workdir=args.keep_workdir,
+        )
+    )
+    print_result(result)
+
+    payload = result.model_dump_json(indent=2)
+    if args.output:
+        args.output.write_text(payload, encoding="utf-8")
+    if args.save_baseline:
+        args.save_baseline.write_text(payload, encoding="utf-8")
+        console.print(f"[green]已保存基线：{args.save_baseline}[/green]")
+
+    if result.persist_mismatch:
+        console.print("[red]报告持久化数量与成功调用数不一致：[/red]")
+        for item in result.persist_mismatch:
+            console.print(f"  [red]{item}[/red]")
+        sys.exit(1)
+
+    if args.baseline:
+        baseline = LoadTestResult.model_validate_json(args.baseline.read_text(encoding="utf-8"))
+        regressions = compare_baseline(result, baseline, args.tolerance)
+        if regressions:
+            console.print("[red]相对基线出现回退：[/red]")
+            for item in regressions:
+                console.print(f"  [red]{item}[/red]")
+            sys.exit(1)
+        console.print("[green]未超出基线容差[/green]")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,8 @@ from __future__ import annotations
 from pathlib import Path
 from typing import Iterable
 
+from .stacktrace import StackTrace, parse_stack_trace
+
 
 def read_log(source: str) -> str:
     """读取日志内容；source 为文件路径或 '-'（代表 stdin）。"""
@@ -26,9 +28,17 @@ def extract_excerpt(raw: str, max_lines: int = 80) -> str:
     return "\n".join(lines[-max_lines:])
 
 
-def extract_stack_summary(raw: str, keywords: Iterable[str] | None = None, max_lines: int = 40) -> str:
-    """简单提取包含关键字的行，用于堆栈摘要。"""
+def extract_stack_summary(
+    raw: str,
+    keywords: Iterable[str] | None = None,
+    max_lines: int = 40,
+    trace: StackTrace | None = None,
+) -> str:
+    """堆栈摘要：优先输出结构化解析后的压缩帧列表，无法识别时退回关键字匹配。"""
     if keywords is None:
+        trace = trace if trace is not None else parse_stack_trace(raw)
+        if trace.exceptions:
+            return "\n".join(trace.condensed().splitlines()[-max_lines:])
         keywords = ("Traceback", "Error", "Exception", "AssertionError", "at ", "File \"")
 
     selected = [
@@ -40,3 +50,9 @@ def extract_stack_summary(raw: str, keywords: Iterable[str] | None = None, max_l
         selected = raw.splitlines()[-max_lines:]
 
     return "\n".join(selected[-max_lines:])
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算 token 数：ASCII 约 4 字符/token，CJK 等宽字符约 1 字符/token。"""
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    return (ascii_chars + 3) // 4 + (len(text) - ascii_chars)
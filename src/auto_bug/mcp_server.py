@@ -1,9 +1,11 @@
 from __future__ import annotations
 
 import argparse
+import json
 import os
+import sys
 from pathlib import Path
-from typing import Annotated, Optional
+from typing import Annotated, Literal, Optional
 
 from dotenv import load_dotenv
 from pydantic import Field
@@ -17,11 +19,126 @@ except ImportError as exc:  # pragma: no cover
         "`uv pip install --editable '.[mcp]'` 后再启动 MCP 服务。"
     ) from exc
 
-from .config import load_config
-from .core import generate_bug_record, generate_debug_record
+from .batch import DEFAULT_MAX_ITEMS, DEFAULT_TOKEN_BUDGET, generate_bug_records_batch
+from .cancellation import run_cancellable
+from .config import AppConfig, load_config
+from .core import (
+    DebugGenerationResult,
+    GenerationResult,
+    generate_bug_record,
+    generate_combined_record,
+    generate_debug_record,
+)
+from .models import BatchItem
+from .profiling import profile_options, run_profiled, set_sample_rate_override
+from .stats import stats
+from .storage import REPORT_NAME, project_path, read_sidecar, report_file, sidecar_path
+from .testreports import DEFAULT_MAX_SAMPLES, generate_test_report_records
+from .update import update_report
+from .usage import summarize_usage
 
 console = Console()
 
+RESOURCE_SCHEME = "autobug"
+ResponseMode = Literal["full", "fields", "reference"]
+REFERENCE_KEYS = ("project", "sequence", "persisted", "file_path", "resource_uri", "fingerprint")
+RESPONSE_MODE_DESCRIPTION = (
+    "full：完整字段与 Markdown；fields：仅结构化字段；"
+    "reference：仅标题与 resource_uri，需要时再读取 MCP 资源获取 Markdown"
+)
+
+
+def load_tool_config(config_path: Optional[str]) -> tuple[Path, AppConfig]:
+    """按工具参数加载配置，返回 (工作目录, 配置)。"""
+    load_dotenv()
+    base_dir = Path.cwd()
+
+    if config_path:
+        resolved_config = Path(config_path).expanduser().resolve()
+        config_dir = resolved_config.parent
+        config_name = resolved_config.name
+    else:
+        config_dir = base_dir
+        config_name = "config.toml"
+
+    try:
+        config = load_config(config_dir, config_name)
+    except Exception as exc:  # pragma: no cover - surfaced to MCP client
+        raise ValueError(f"配置加载失败：{exc}") from exc
+    return base_dir, config
+
+
+def report_uri(project: str, file_path: Path) -> str:
+    return f"{RESOURCE_SCHEME}://{project}/{file_path.stem}"
+
+
+def shape_payload(
+    payload: dict[str, object], mode: ResponseMode, keep: tuple[str, ...]
+) -> dict[str, object]:
+    """按 response_mode 裁剪响应：fields 去掉 markdown，reference 只保留定位信息与 keep 字段。
+
+    未写入 Vault 的报告无法通过资源读取，始终返回完整内容。
+    """
+    file_path = payload.get("file_path")
+    if not file_path:
+        return payload
+    payload["resource_uri"] = report_uri(str(payload["project"]), Path(str(file_path)))
+    if mode == "fields":
+        return {key: value for key, value in payload.items() if key != "markdown"}
+    if mode == "reference":
+        return {key: payload[key] for key in (*REFERENCE_KEYS, *keep) if key in payload}
+    return payload
+
+
+def bug_payload(result: GenerationResult, mode: ResponseMode = "full") -> dict[str, object]:
+    payload: dict[str, object] = {
+        "project": result.project,
+        "sequence": result.sequence,
+        "persisted": result.persisted,
+        "bug_title": result.report.bug_title,
+        "severity": result.report.severity,
+        "command": result.command,
+        "environment": result.environment,
+        "markdown": result.markdown,
+        "file_path": str(result.file_path) if result.file_path else None,
+        "fingerprint": result.fingerprint,
+        "reproduction_steps": result.report.reproduction_steps,
+        "expected": result.report.expected,
+        "actual": result.report.actual,
+        "probable_cause": result.report.probable_cause,
+        "tags": result.report.tags,
+    }
+    return shape_payload(payload, mode, ("bug_title", "severity"))
+
+
+def debug_payload(result: DebugGenerationResult, mode: ResponseMode = "full") -> dict[str, object]:
+    payload: dict[str, object] = {
+        "project": result.project,
+        "sequence": result.sequence,
+        "persisted": result.persisted,
+        "report_title": result.report.report_title,
+        "command": result.command,
+        "environment": result.environment,
+        "markdown": result.markdown,
+        "file_path": str(result.file_path) if result.file_path else None,
+        "fingerprint": result.fingerprint,
+        "initial_state": result.report.initial_state,
+        "symptom_summary": result.report.symptom_summary,
+        "analysis_process": result.report.analysis_process,
+        "root_cause": result.report.root_cause,
+        "fix_steps": result.report.fix_steps,
+        "verification": result.report.verification,
+        "lessons": result.report.lessons,
+        "extra_notes": result.report.extra_notes,
+    }
+    return shape_payload(payload, mode, ("report_title",))
+
+
+def with_profile_path(payload: dict[str, object], profile_path: Optional[Path]) -> dict[str, object]:
+    if profile_path is not None:
+        payload["profile_path"] = str(profile_path)
+    return payload
+
 
 def create_server(host: str, port: int, instructions: Optional[str] = None) -> FastMCP:
     server = FastMCP(
@@ -55,28 +172,27 @@ def create_server(host: str, port: int, instructions: Optional[str] = None) -> F
             Optional[str],
             Field(description="自定义配置文件路径，默认为工作目录下 config.toml"),
         ] = None,
+        force_llm: Annotated[
+            bool, Field(description="跳过本地规则快速路径，始终调用 LLM")
+        ] = False,
+        profile: Annotated[
+            bool, Field(description="对本次请求进行 cProfile 性能剖析并写入 profiles 目录")
+        ] = False,
+        response_mode: Annotated[
+            ResponseMode, Field(description=RESPONSE_MODE_DESCRIPTION)
+        ] = "full",
     ) -> dict[str, object]:
-        load_dotenv()
-        base_dir = Path.cwd()
-
-        resolved_config: Path
-        if config_path:
-            resolved_config = Path(config_path).expanduser().resolve()
-            config_dir = resolved_config.parent
-            config_name = resolved_config.name
-        else:
-            config_dir = base_dir
-            config_name = "config.toml"
-
-        try:
-            config = load_config(config_dir, config_name)
-        except Exception as exc:  # pragma: no cover - surfaced to MCP client
-            raise ValueError(f"配置加载失败：{exc}") from exc
+        base_dir, config = load_tool_config(config_path)
 
         target_project = project or config.default_project
 
         try:
-            result = generate_bug_record(
+            # 在线程中执行阻塞的 LLM 调用，避免阻塞事件循环
+            result, profile_path = await run_cancellable(
+                "bug_report",
+                run_profiled,
+                generate_bug_record,
+                profile_options(config, base_dir, f"bug_report-{target_project}", profile),
                 base_dir=base_dir,
                 config=config,
                 project=target_project,
@@ -84,26 +200,12 @@ def create_server(host: str, port: int, instructions: Optional[str] = None) -> F
                 command=command,
                 environment=environment,
                 persist=persist,
+                force_llm=force_llm,
             )
         except Exception as exc:  # pragma: no cover - surfaced to MCP client
             raise ValueError(f"生成缺陷报告失败：{exc}") from exc
 
-        return {
-            "project": result.project,
-            "sequence": result.sequence,
-            "persisted": result.persisted,
-            "bug_title": result.report.bug_title,
-            "severity": result.report.severity,
-            "command": result.command,
-            "environment": result.environment,
-            "markdown": result.markdown,
-            "file_path": str(result.file_path) if result.file_path else None,
-            "reproduction_steps": result.report.reproduction_steps,
-            "expected": result.report.expected,
-            "actual": result.report.actual,
-            "probable_cause": result.report.probable_cause,
-            "tags": result.report.tags,
-        }
+        return with_profile_path(bug_payload(result, response_mode), profile_path)
 
     @server.tool(
         name="debug_report",
@@ -127,28 +229,74 @@ def create_server(host: str, port: int, instructions: Optional[str] = None) -> F
             Optional[str],
             Field(description="自定义配置文件路径，默认为工作目录下 config.toml"),
         ] = None,
+        profile: Annotated[
+            bool, Field(description="对本次请求进行 cProfile 性能剖析并写入 profiles 目录")
+        ] = False,
+        response_mode: Annotated[
+            ResponseMode, Field(description=RESPONSE_MODE_DESCRIPTION)
+        ] = "full",
     ) -> dict[str, object]:
-        load_dotenv()
-        base_dir = Path.cwd()
-
-        resolved_config: Path
-        if config_path:
-            resolved_config = Path(config_path).expanduser().resolve()
-            config_dir = resolved_config.parent
-            config_name = resolved_config.name
-        else:
-            config_dir = base_dir
-            config_name = "config.toml"
+        base_dir, config = load_tool_config(config_path)
+
+        target_project = project or config.default_project
 
         try:
-            config = load_config(config_dir, config_name)
+            result, profile_path = await run_cancellable(
+                "debug_report",
+                run_profiled,
+                generate_debug_record,
+                profile_options(config, base_dir, f"debug_report-{target_project}", profile),
+                base_dir=base_dir,
+                config=config,
+                project=target_project,
+                log_text=log_text,
+                command=command,
+                environment=environment,
+                persist=persist,
+            )
         except Exception as exc:  # pragma: no cover
-            raise ValueError(f"配置加载失败：{exc}") from exc
+            raise ValueError(f"生成调试报告失败：{exc}") from exc
 
+        return with_profile_path(debug_payload(result, response_mode), profile_path)
+
+    @server.tool(
+        name="bug_debug_report",
+        description="单次 LLM 调用同时生成缺陷报告与调试报告，两者共享同一序号。",
+    )
+    async def bug_debug_report(  # type: ignore[unused-variable]
+        log_text: Annotated[str, Field(description="完整的终端/测试日志文本")],
+        project: Annotated[
+            Optional[str], Field(description="项目名，留空则使用配置默认值")
+        ] = None,
+        command: Annotated[
+            str, Field(description="触发日志的命令或操作")
+        ] = "unknown",
+        environment: Annotated[
+            str, Field(description="执行环境描述，例如 local-dev、CI 等")
+        ] = "local",
+        persist: Annotated[
+            bool, Field(description="是否写入 Obsidian Vault")
+        ] = True,
+        config_path: Annotated[
+            Optional[str],
+            Field(description="自定义配置文件路径，默认为工作目录下 config.toml"),
+        ] = None,
+        profile: Annotated[
+            bool, Field(description="对本次请求进行 cProfile 性能剖析并写入 profiles 目录")
+        ] = False,
+        response_mode: Annotated[
+            ResponseMode, Field(description=RESPONSE_MODE_DESCRIPTION)
+        ] = "full",
+    ) -> dict[str, object]:
+        base_dir, config = load_tool_config(config_path)
         target_project = project or config.default_project
 
         try:
-            result = generate_debug_record(
+            result, profile_path = await run_cancellable(
+                "bug_debug_report",
+                run_profiled,
+                generate_combined_record,
+                profile_options(config, base_dir, f"bug_debug_report-{target_project}", profile),
                 base_dir=base_dir,
                 config=config,
                 project=target_project,
@@ -158,30 +306,297 @@ def create_server(host: str, port: int, instructions: Optional[str] = None) -> F
                 persist=persist,
             )
         except Exception as exc:  # pragma: no cover
-            raise ValueError(f"生成调试报告失败：{exc}") from exc
+            raise ValueError(f"生成合并报告失败：{exc}") from exc
 
-        return {
+        return with_profile_path(
+            {
+                "bug": bug_payload(result.bug, response_mode),
+                "debug": debug_payload(result.debug, response_mode),
+            },
+            profile_path,
+        )
+
+    @server.tool(
+        name="update_report",
+        description="用新日志增量更新已有的 bugNNN/debugNNN 报告，仅把日志增量与原结构化报告发送给 LLM。",
+    )
+    async def update_report_tool(  # type: ignore[unused-variable]
+        report: Annotated[str, Field(description="报告名称，例如 bug003 或 debug002")],
+        log_text: Annotated[str, Field(description="重试后得到的新日志文本")],
+        project: Annotated[
+            Optional[str], Field(description="项目名，留空则使用配置默认值")
+        ] = None,
+        command: Annotated[
+            Optional[str], Field(description="触发日志的命令，留空沿用原报告")
+        ] = None,
+        environment: Annotated[
+            Optional[str], Field(description="执行环境描述，留空沿用原报告")
+        ] = None,
+        config_path: Annotated[
+            Optional[str],
+            Field(description="自定义配置文件路径，默认为工作目录下 config.toml"),
+        ] = None,
+        response_mode: Annotated[
+            ResponseMode, Field(description=RESPONSE_MODE_DESCRIPTION)
+        ] = "full",
+    ) -> dict[str, object]:
+        base_dir, config = load_tool_config(config_path)
+        target_project = project or config.default_project
+
+        try:
+            result = await run_cancellable(
+                "update_report",
+                update_report,
+                base_dir=base_dir,
+                config=config,
+                project=target_project,
+                report=report,
+                log_text=log_text,
+                command=command,
+                environment=environment,
+            )
+        except Exception as exc:  # pragma: no cover
+            raise ValueError(f"更新报告失败：{exc}") from exc
+
+        payload: dict[str, object] = {
             "project": result.project,
-            "sequence": result.sequence,
-            "persisted": result.persisted,
-            "report_title": result.report.report_title,
-            "command": result.command,
-            "environment": result.environment,
+            "report": result.name,
+            "kind": result.kind,
+            "file_path": str(result.file_path),
+            "changed_fields": result.changed_fields,
+            "delta_lines": result.delta_lines,
+            "llm_called": result.llm_called,
             "markdown": result.markdown,
-            "file_path": str(result.file_path) if result.file_path else None,
-            "initial_state": result.report.initial_state,
-            "symptom_summary": result.report.symptom_summary,
-            "analysis_process": result.report.analysis_process,
-            "root_cause": result.report.root_cause,
-            "fix_steps": result.report.fix_steps,
-            "verification": result.report.verification,
-            "lessons": result.report.lessons,
-            "extra_notes": result.report.extra_notes,
         }
+        return shape_payload(
+            payload, response_mode, ("report", "kind", "changed_fields", "delta_lines", "llm_called")
+        )
+
+    @server.tool(
+        name="backfill_reports",
+        description=(
+            "批量回填：把多条小日志打包进少量 LLM 请求并逐条生成缺陷报告；"
+            "以批量优先级排队，交互类工具的请求优先调度。"
+        ),
+    )
+    async def backfill_reports(  # type: ignore[unused-variable]
+        items: Annotated[
+            list[BatchItem],
+            Field(description="待回填的日志列表，每项包含唯一 id、log_text 以及可选的 command、environment"),
+        ],
+        project: Annotated[
+            Optional[str], Field(description="项目名，留空则使用配置默认值")
+        ] = None,
+        token_budget: Annotated[
+            int, Field(description="单次批量请求的日志 token 预算")
+        ] = DEFAULT_TOKEN_BUDGET,
+        max_items: Annotated[int, Field(description="单批最多日志数")] = DEFAULT_MAX_ITEMS,
+        persist: Annotated[
+            bool, Field(description="是否写入 Obsidian Vault")
+        ] = True,
+        config_path: Annotated[
+            Optional[str],
+            Field(description="自定义配置文件路径，默认为工作目录下 config.toml"),
+        ] = None,
+        force_llm: Annotated[
+            bool, Field(description="跳过本地规则快速路径，始终调用 LLM")
+        ] = False,
+        response_mode: Annotated[
+            ResponseMode, Field(description=RESPONSE_MODE_DESCRIPTION)
+        ] = "full",
+    ) -> dict[str, object]:
+        base_dir, config = load_tool_config(config_path)
+        target_project = project or config.default_project
+
+        try:
+            results = await run_cancellable(
+                "backfill_reports",
+                generate_bug_records_batch,
+                base_dir=base_dir,
+                config=config,
+                project=target_project,
+                items=items,
+                persist=persist,
+                token_budget=token_budget,
+                max_items=max_items,
+                force_llm=force_llm,
+            )
+        except Exception as exc:  # pragma: no cover
+            raise ValueError(f"批量生成失败：{exc}") from exc
+
+        return {
+            "reports": [
+                {"id": item.id, **bug_payload(result, response_mode)}
+                for item, result in zip(items, results)
+            ]
+        }
+
+    @server.tool(
+        name="ingest_test_report",
+        description=(
+            "导入 JUnit XML / pytest reportlog：按失败签名分组，每组一次 LLM 调用生成一份报告；"
+            "以批量优先级排队，单组失败不影响其余分组。"
+        ),
+    )
+    async def ingest_test_report(  # type: ignore[unused-variable]
+        source: Annotated[
+            str, Field(description="服务端可读的 JUnit XML（.xml）或 pytest --report-log（.jsonl）路径")
+        ],
+        project: Annotated[
+            Optional[str], Field(description="项目名，留空则使用配置默认值")
+        ] = None,
+        command: Annotated[str, Field(description="触发测试的命令")] = "pytest",
+        environment: Annotated[str, Field(description="执行环境描述")] = "CI",
+        max_samples: Annotated[
+            int, Field(description="每组发送给 LLM 的代表样本数")
+        ] = DEFAULT_MAX_SAMPLES,
+        persist: Annotated[
+            bool, Field(description="是否写入 Obsidian Vault")
+        ] = True,
+        config_path: Annotated[
+            Optional[str],
+            Field(description="自定义配置文件路径，默认为工作目录下 config.toml"),
+        ] = None,
+        force_llm: Annotated[
+            bool, Field(description="跳过本地规则快速路径，始终调用 LLM")
+        ] = False,
+        response_mode: Annotated[
+            ResponseMode, Field(description=RESPONSE_MODE_DESCRIPTION)
+        ] = "full",
+    ) -> dict[str, object]:
+        base_dir, config = load_tool_config(config_path)
+        target_project = project or config.default_project
+
+        try:
+            groups = await run_cancellable(
+                "ingest_test_report",
+                generate_test_report_records,
+                base_dir=base_dir,
+                config=config,
+                project=target_project,
+                source=Path(source).expanduser(),
+                command=command,
+                environment=environment,
+                persist=persist,
+                max_samples=max_samples,
+                force_llm=force_llm,
+            )
+        except Exception as exc:  # pragma: no cover
+            raise ValueError(f"导入测试报告失败：{exc}") from exc
+
+        return {
+            "groups": [
+                {
+                    "signature": group.signature,
+                    "tests": group.tests,
+                    "report": (
+                        bug_payload(group.result, response_mode) if group.result else None
+                    ),
+                    "error": group.error,
+                }
+                for group in groups
+            ],
+            "failed": [group.signature for group in groups if group.result is None],
+        }
+
+    @server.resource(
+        f"{RESOURCE_SCHEME}://{{project}}",
+        name="project_reports",
+        description="列出项目下已写入 Vault 的报告及其资源 URI（使用默认配置）。",
+        mime_type="application/json",
+    )
+    def project_reports(project: str) -> str:  # type: ignore[unused-variable]
+        _, config = load_tool_config(None)
+        project_dir = project_path(config.vault_root, project)
+        entries = []
+        for path in sorted(project_dir.glob("*.md")):
+            if not REPORT_NAME.match(path.stem):
+                continue
+            sidecar = sidecar_path(path)
+            # 没有侧文件的是正在写入的占位文件
+            if not sidecar.exists():
+                continue
+            report = read_sidecar(sidecar).get("report", {})
+            title = report.get("bug_title") or report.get("report_title")
+            entries.append(
+                {"name": path.stem, "title": title, "uri": report_uri(project, path)}
+            )
+        return json.dumps(entries, ensure_ascii=False)
+
+    @server.resource(
+        f"{RESOURCE_SCHEME}://{{project}}/{{report}}",
+        name="report_markdown",
+        description="按需读取已写入 Vault 的 bugNNN / debugNNN 报告 Markdown。",
+        mime_type="text/markdown",
+    )
+    def report_markdown(project: str, report: str) -> str:  # type: ignore[unused-variable]
+        _, config = load_tool_config(None)
+        path = report_file(config.vault_root, project, report)
+        if not path.exists():
+            raise ValueError(f"报告不存在：{project}/{report}")
+        return path.read_text(encoding="utf-8")
+
+    @server.resource(
+        f"{RESOURCE_SCHEME}://{{project}}/{{report}}/fields",
+        name="report_fields",
+        description="读取报告的结构化字段（JSON 侧文件中的 report 部分）。",
+        mime_type="application/json",
+    )
+    def report_fields(project: str, report: str) -> str:  # type: ignore[unused-variable]
+        _, config = load_tool_config(None)
+        path = sidecar_path(report_file(config.vault_root, project, report))
+        if not path.exists():
+            raise ValueError(f"报告侧文件不存在：{project}/{report}")
+        return json.dumps(read_sidecar(path).get("report", {}), ensure_ascii=False)
+
+    @server.tool(
+        name="server_stats",
+        description="查看服务端统计：各模型档位请求数、耗时等。",
+    )
+    async def server_stats() -> dict[str, object]:  # type: ignore[unused-variable]
+        return stats.snapshot()
+
+    @server.tool(
+        name="usage_summary",
+        description="按项目/工具/模型/日期/日志规模汇总 LLM token 用量与耗时。",
+    )
+    async def usage_summary(  # type: ignore[unused-variable]
+        group_by: Annotated[
+            str, Field(description="分组维度：project / tool / model / day / log_size")
+        ] = "project",
+        since_days: Annotated[
+            Optional[float], Field(description="仅统计最近 N 天，留空统计全部")
+        ] = None,
+        project: Annotated[Optional[str], Field(description="仅统计指定项目")] = None,
+        config_path: Annotated[
+            Optional[str],
+            Field(description="自定义配置文件路径，默认为工作目录下 config.toml"),
+        ] = None,
+    ) -> dict[str, object]:
+        base_dir, config = load_tool_config(config_path)
+        ledger = config.resolve_usage_ledger(base_dir)
+        if ledger is None:
+            return {"enabled": False, "rows": []}
+        rows = summarize_usage(ledger, group_by=group_by, since_days=since_days, project=project)
+        return {"enabled": True, "rows": [row.model_dump() for row in rows]}
 
     return server
 
 
+def route_console_to_stderr() -> None:
+    """stdio 传输下 stdout 专用于 MCP 协议帧，把各模块的 rich 输出改写到 stderr。
+
+    以 `python -m auto_bug.mcp_server` 启动时本模块注册为 __main__，因此按 __spec__.name 判断。
+    """
+    for key, module in list(sys.modules.items()):
+        spec = getattr(module, "__spec__", None)
+        name = spec.name if spec is not None else key
+        if name == "auto_bug" or name.startswith("auto_bug."):
+            module_console = getattr(module, "console", None)
+            if isinstance(module_console, Console):
+                module_console.file = sys.stderr
+
+
 def main() -> None:
     parser = argparse.ArgumentParser(description="auto-bug MCP server（FastMCP）")
     parser.add_argument(
@@ -201,8 +616,23 @@ def main() -> None:
         default=int(os.getenv("AUTO_BUG_MCP_PORT", "8001")),
         help="仅在 transport=sse 时有效，HTTP 服务监听端口。",
     )
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        type=float,
+        const=1.0,
+        default=None,
+        metavar="SAMPLE_RATE",
+        help="自动采样性能剖析（可选采样率，默认 1.0），两次采样间隔受 [profiling] min_interval_seconds 限制。",
+    )
     args = parser.parse_args()
 
+    if args.profile is not None:
+        set_sample_rate_override(args.profile)
+
+    if args.transport == "stdio":
+        route_console_to_stderr()
+
     server = create_server(args.host, args.port)
     console.print(
         f"[cyan]Auto-bug MCP server 已启动[/cyan] "
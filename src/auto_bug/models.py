@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from datetime import datetime
-from typing import List, Optional
+from typing import Any, Dict, List, Literal, Optional
 
 from pydantic import BaseModel, Field
 
@@ -31,6 +31,35 @@ class DebugReport(BaseModel):
     extra_notes: Optional[str] = None
 
 
+class CombinedReport(LLMReport, DebugReport):
+    """合并 Bug 与调试报告字段，供单次 LLM 调用同时生成两份报告。"""
+
+    def to_bug_report(self) -> LLMReport:
+        return LLMReport.model_validate(self.model_dump(include=set(LLMReport.model_fields)))
+
+    def to_debug_report(self) -> DebugReport:
+        return DebugReport.model_validate(self.model_dump(include=set(DebugReport.model_fields)))
+
+
+class BatchItem(BaseModel):
+    """批量回填的单条输入；id 用于在合并响应中对应结果。"""
+
+    id: str
+    log_text: str
+    command: str = Field(default="unknown")
+    environment: str = Field(default="local")
+
+
+class BatchReportItem(LLMReport):
+    id: str
+
+
+class BatchResponse(BaseModel):
+    """批量回填的响应结构，仅用于生成结构化输出的 JSON Schema。"""
+
+    reports: List[BatchReportItem]
+
+
 class RenderContext(BaseModel):
     sequence: str
     project: str
@@ -46,6 +75,10 @@ class RenderContext(BaseModel):
     stack_summary: str
     extra_notes: str
     tags: List[str]
+    # 归档中完整原始日志的相对链接（未启用归档时为 None）
+    raw_log: Optional[str] = None
+    # 按失败签名分组导入测试报告时，同组的全部用例
+    affected_tests: List[str] = Field(default_factory=list)
 
 
 class DebugRenderContext(BaseModel):
@@ -65,3 +98,18 @@ class DebugRenderContext(BaseModel):
     extra_notes: str
     log_excerpt: str
     stack_summary: str
+    raw_log: Optional[str] = None
+
+
+class ReportSidecar(BaseModel):
+    """报告旁的 JSON 侧文件：结构化结果 + 渲染上下文 + 渲染时的模板哈希。"""
+
+    version: int = 1
+    kind: Literal["bug", "debug"]
+    report: Dict[str, Any]
+    context: Dict[str, Any]
+    template_hash: str
+    context_hash: str
+    # 生成时实际发送给 LLM 的日志摘录与堆栈摘要，增量更新以此为比较基准；旧侧文件中为 None
+    log_excerpt: Optional[str] = None
+    stack_summary: Optional[str] = None
@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import cProfile
+import io
+import pstats
+import random
+import re
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Optional, TypeVar
+
+from pydantic import BaseModel
+from rich.console import Console
+
+from .config import AppConfig
+from .stats import stats
+
+console = Console()
+
+T = TypeVar("T")
+
+# cProfile 同一时间只允许一个活动实例（3.12+ 基于 sys.monitoring），并发请求中只剖析一个
+_active = threading.Lock()
+_state_lock = threading.Lock()
+_last_sampled = 0.0
+_sample_rate_override: Optional[float] = None
+
+
+class ProfileOptions(BaseModel):
+    directory: Path
+    label: str
+    requested: bool = False
+    sample_rate: float = 0.0
+    min_interval_seconds: float = 60.0
+
+
+def set_sample_rate_override(rate: Optional[float]) -> None:
+    """服务端启动参数覆盖配置中的自动采样率（如 `auto-bug-mcp --profile`）。"""
+    global _sample_rate_override
+    _sample_rate_override = rate
+
+
+def profile_options(
+    config: AppConfig, base_dir: Path, label: str, requested: bool = False
+) -> ProfileOptions:
+    settings = config.profiling
+    rate = settings.sample_rate if _sample_rate_override is None else _sample_rate_override
+    return ProfileOptions(
+        directory=config.resolve_profile_dir(base_dir),
+        label=label,
+        requested=requested,
+        sample_rate=rate,
+        min_interval_seconds=settings.min_interval_seconds,
+    )
+
+
+def _should_sample(options: ProfileOptions) -> bool:
+    """显式请求总是剖析；自动采样按概率抽样，且两次之间至少间隔 min_interval_seconds。"""
+    global _last_sampled
+    if options.requested:
+        return True
+    if options.sample_rate <= 0 or random.random() >= options.sample_rate:
+        return False
+    with _state_lock:
+        now = time.monotonic()
+        if _last_sampled and now - _last_sampled < options.min_interval_seconds:
+            return False
+        _last_sampled = now
+        return True
+
+
+def _write_profile(profiler: cProfile.Profile, options: ProfileOptions) -> Path:
+    options.directory.mkdir(parents=True, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+    label = re.sub(r"[^\w.-]+", "_", options.label)
+    path = options.directory / f"{stamp}-{label}.prof"
+    profiler.dump_stats(path)
+
+    summary = io.StringIO()
+    pstats.Stats(profiler, stream=summary).sort_stats("cumulative").print_stats(40)
+    path.with_suffix(".txt").write_text(summary.getvalue(), encoding="utf-8")
+    return path
+
+
+def run_profiled(
+    func: Callable[..., T], options: ProfileOptions, /, **kwargs: object
+) -> tuple[T, Optional[Path]]:
+    """按需用 cProfile 包裹一次调用，返回 (结果, .prof 路径)。
+
+    输出为标准 pstats 文件，可用 snakeviz / flameprof 等工具生成火焰图；
+    同目录的 .txt 为按累计耗时排序的前 40 项摘要。
+    """
+    if not _should_sample(options) or not _active.acquire(blocking=False):
+        return func(**kwargs), None
+
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+        try:
+            result = func(**kwargs)
+        finally:
+            profiler.disable()
+        path = _write_profile(profiler, options)
+    finally:
+        _active.release()
+
+    stats.incr("profiling.samples")
+    console.print(f"[cyan]已写入性能剖析：{path}[/cyan]")
+    return result, path
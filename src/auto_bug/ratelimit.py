@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+import heapq
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .cancellation import current_cancel_token
+from .config import RateLimitConfig
+from .stats import stats
+
+# 可取消请求在排队时的轮询间隔（秒）
+CANCEL_POLL_SECONDS = 0.25
+
+# 数值越小越优先：交互式 MCP/CLI 请求排在批量回填之前
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 10
+
+_priority: ContextVar[int] = ContextVar("auto_bug_llm_priority", default=PRIORITY_INTERACTIVE)
+
+
+@contextmanager
+def request_priority(level: int) -> Iterator[None]:
+    """在当前上下文（含 asyncio.to_thread 派生的线程）内设置 LLM 请求优先级。"""
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class TokenBucket:
+    """令牌桶：容量为每分钟额度，按秒匀速补充。"""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = float(per_minute)
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        self._refill(now)
+        # 单次请求超过桶容量时按满桶放行，避免永久阻塞
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float) -> None:
+        self.tokens -= min(amount, self.capacity)
+
+
+class ProviderLimiter:
+    """同一 provider+model 的 RPM 与 TPM 双令牌桶。"""
+
+    def __init__(self, limits: RateLimitConfig):
+        self.limits = limits
+        self.requests = TokenBucket(limits.requests_per_minute) if limits.requests_per_minute else None
+        self.tokens = TokenBucket(limits.tokens_per_minute) if limits.tokens_per_minute else None
+
+    def wait_time(self, tokens: int, now: float) -> float:
+        wait = 0.0
+        if self.requests is not None:
+            wait = max(wait, self.requests.wait_time(1, now))
+        if self.tokens is not None:
+            wait = max(wait, self.tokens.wait_time(tokens, now))
+        return wait
+
+    def consume(self, tokens: int) -> None:
+        if self.requests is not None:
+            self.requests.consume(1)
+        if self.tokens is not None:
+            self.tokens.consume(tokens)
+
+
+class LLMScheduler:
+    """按优先级排队的限流器：队首请求等待令牌，其余请求等待队首放行。
+
+    同优先级按到达顺序（FIFO）处理。
+    """
+
+    def __init__(self) -> None:
+        self._cond = threading.Condition()
+        self._queues: Dict[Tuple[str, str], List[Tuple[int, int]]] = {}
+        self._limiters: Dict[Tuple[str, str], ProviderLimiter] = {}
+        self._counter = itertools.count()
+
+    def _limiter(self, key: Tuple[str, str], limits: RateLimitConfig) -> ProviderLimiter:
+        limiter = self._limiters.get(key)
+        if limiter is None or limiter.limits != limits:
+            limiter = ProviderLimiter(limits)
+            self._limiters[key] = limiter
+        return limiter
+
+    def acquire(
+        self,
+        provider: str,
+        model: str,
+        tokens: int,
+        limits: RateLimitConfig,
+        priority: Optional[int] = None,
+    ) -> float:
+        """阻塞直到可以发出请求，返回排队等待的秒数。"""
+        if not limits.requests_per_minute and not limits.tokens_per_minute:
+            return 0.0
+
+        key = (provider, model)
+        token = current_cancel_token()
+        poll = None if token is None else CANCEL_POLL_SECONDS
+        ticket = (_priority.get() if priority is None else priority, next(self._counter))
+        started = time.monotonic()
+        with self._cond:
+            queue = self._queues.setdefault(key, [])
+            heapq.heappush(queue, ticket)
+            depth = sum(len(items) for items in self._queues.values())
+            stats.set_gauge("ratelimit.queue_depth", depth)
+            try:
+                while True:
+                    if token is not None:
+                        token.raise_if_cancelled()
+                    if queue[0] == ticket:
+                        now = time.monotonic()
+                        limiter = self._limiter(key, limits)
+                        wait = limiter.wait_time(tokens, now)
+                        if wait <= 0:
+                            limiter.consume(tokens)
+                            break
+                        self._cond.wait(timeout=wait if poll is None else min(wait, poll))
+                    else:
+                        self._cond.wait(timeout=poll)
+            finally:
+                queue.remove(ticket)
+                heapq.heapify(queue)
+                stats.set_gauge(
+                    "ratelimit.queue_depth", sum(len(items) for items in self._queues.values())
+                )
+                self._cond.notify_all()
+
+        waited = time.monotonic() - started
+        stats.observe(f"ratelimit.{provider}.{model}.wait", waited)
+        if ticket[0] > PRIORITY_INTERACTIVE:
+            stats.observe("ratelimit.wait.batch", waited)
+        else:
+            stats.observe("ratelimit.wait.interactive", waited)
+        return waited
+
+
+scheduler = LLMScheduler()
@@ -1,19 +1,29 @@
 from __future__ import annotations
 
+import hashlib
+from functools import lru_cache
 from pathlib import Path
 
 from jinja2 import Environment, FileSystemLoader, select_autoescape
+from pydantic import BaseModel
 
-from .models import RenderContext
 
-
-def render_markdown(template_path: Path, context: RenderContext) -> str:
-    env = Environment(
-        loader=FileSystemLoader(str(template_path.parent)),
+@lru_cache(maxsize=16)
+def _environment(template_dir: str) -> Environment:
+    # 复用 Environment 以命中 jinja2 的模板编译缓存（模板文件变更时会自动重新加载）
+    return Environment(
+        loader=FileSystemLoader(template_dir),
         autoescape=select_autoescape(enabled_extensions=("html",)),
         trim_blocks=True,
         lstrip_blocks=True,
     )
 
+
+def render_markdown(template_path: Path, context: BaseModel) -> str:
+    env = _environment(str(template_path.parent))
     template = env.get_template(template_path.name)
     return template.render(**context.model_dump())
+
+
+def template_hash(template_path: Path) -> str:
+    return hashlib.sha256(template_path.read_bytes()).hexdigest()[:16]
@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional
+
+from pydantic import BaseModel, Field
+
+from .config import AppConfig
+from .models import DebugRenderContext, RenderContext, ReportSidecar
+from .renderer import render_markdown, template_hash
+from .storage import hash_payload, read_sidecar, replace_report_file, write_sidecar
+
+# 少量文件时进程池的启动开销大于收益，直接在当前进程渲染
+POOL_THRESHOLD = 32
+
+
+class RerenderSummary(BaseModel):
+    rendered: int = 0
+    skipped: int = 0
+    # 报告 Markdown 已被删除、只剩侧文件的孤立项，不会重新生成
+    orphaned: int = 0
+    failed: List[str] = Field(default_factory=list)
+
+
+def iter_sidecars(vault_root: Path, projects: Optional[List[str]] = None) -> Iterator[Path]:
+    if projects:
+        project_dirs = [vault_root / project for project in projects]
+    else:
+        project_dirs = sorted(path for path in vault_root.iterdir() if path.is_dir())
+
+    for project_dir in project_dirs:
+        for prefix in ("bug", "debug"):
+            yield from sorted(project_dir.glob(f"{prefix}*.json"))
+
+
+def rerender_sidecar(path: str, template_path: str, current_hash: str, force: bool) -> str:
+    """依据侧文件重新渲染单个报告，返回 rendered / skipped / orphaned。需为顶层函数以便进程池序列化。
+
+    用户删除的报告（Markdown 不存在）不会被重新创建，以免撤销删除并干扰 gc-logs 的引用判断。
+    """
+    sidecar_file = Path(path)
+    report_path = sidecar_file.with_suffix(".md")
+    if not report_path.exists():
+        return "orphaned"
+    sidecar = ReportSidecar.model_validate(read_sidecar(sidecar_file))
+    context_hash = hash_payload(sidecar.context)
+
+    if (
+        not force
+        and sidecar.template_hash == current_hash
+        and sidecar.context_hash == context_hash
+    ):
+        return "skipped"
+
+    context_model = RenderContext if sidecar.kind == "bug" else DebugRenderContext
+    context = context_model.model_validate(sidecar.context)
+    replace_report_file(report_path, render_markdown(Path(template_path), context))
+
+    sidecar.template_hash = current_hash
+    sidecar.context_hash = context_hash
+    write_sidecar(report_path, sidecar.model_dump(mode="json"))
+    return "rendered"
+
+
+def _rerender_task(args: tuple[str, str, str, bool]) -> tuple[str, str]:
+    path = args[0]
+    try:
+        return path, rerender_sidecar(*args)
+    except Exception as exc:  # pylint: disable=broad-except
+        return path, f"failed: {exc}"
+
+
+def rerender_vault(
+    *,
+    base_dir: Path,
+    config: AppConfig,
+    projects: Optional[List[str]] = None,
+    workers: Optional[int] = None,
+    force: bool = False,
+) -> RerenderSummary:
+    """用侧文件重新渲染整个 Vault（或指定项目），不调用 LLM。
+
+    模板哈希与上下文哈希均未变化的报告会被跳过。
+    """
+    templates = {
+        "bug": config.resolve_template(base_dir),
+        "debug": config.resolve_debug_template(base_dir),
+    }
+    hashes = {kind: template_hash(path) for kind, path in templates.items()}
+
+    tasks = []
+    for sidecar_file in iter_sidecars(config.vault_root, projects):
+        kind = "debug" if sidecar_file.name.startswith("debug") else "bug"
+        tasks.append((str(sidecar_file), str(templates[kind]), hashes[kind], force))
+
+    if workers == 1 or len(tasks) < POOL_THRESHOLD:
+        outcomes = map(_rerender_task, tasks)
+        return _summarize(outcomes)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        chunksize = max(1, len(tasks) // ((workers or os.cpu_count() or 1) * 4))
+        return _summarize(pool.map(_rerender_task, tasks, chunksize=chunksize))
+
+
+def _summarize(outcomes: Iterable[tuple[str, str]]) -> RerenderSummary:
+    summary = RerenderSummary()
+    for path, status in outcomes:
+        if status == "rendered":
+            summary.rendered += 1
+        elif status == "skipped":
+            summary.skipped += 1
+        elif status == "orphaned":
+            summary.orphaned += 1
+        else:
+            summary.failed.append(f"{path}: {status}")
+    return summary
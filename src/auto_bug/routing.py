@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import re
+import time
+from typing import Callable, Dict, List, Optional, Type, TypeVar
+
+from pydantic import BaseModel, ValidationError
+from rich.console import Console
+
+from .config import LLMConfig, ModelTier
+from .llm import LLMClient
+from .logs import estimate_tokens
+from .stacktrace import StackTrace, parse_stack_trace
+from .stats import stats
+
+console = Console()
+
+T = TypeVar("T")
+
+FRAME_PATTERN = re.compile(r'^\s*(File "|at |\S+\.go:\d+)')
+EXCEPTION_PATTERN = re.compile(r"\b([A-Za-z_][\w.]*(?:Error|Exception|Exit|Interrupt))\b")
+PLACEHOLDER = "待补充"
+
+
+class LogFeatures(BaseModel):
+    log_tokens: int
+    stack_depth: int
+    exception_count: int
+
+
+def analyze_log(
+    excerpt: str, stack_summary: str, trace: Optional[StackTrace] = None
+) -> LogFeatures:
+    trace = trace if trace is not None else parse_stack_trace(excerpt)
+    if trace.exceptions:
+        frames = max(len(record.frames) for record in trace.exceptions)
+        exceptions = {record.type.rsplit(".", 1)[-1] for record in trace.exceptions}
+    else:
+        frames = sum(1 for line in stack_summary.splitlines() if FRAME_PATTERN.match(line))
+        exceptions = {
+            match.group(1).rsplit(".", 1)[-1] for match in EXCEPTION_PATTERN.finditer(excerpt)
+        }
+    return LogFeatures(
+        log_tokens=estimate_tokens(excerpt) + estimate_tokens(stack_summary),
+        stack_depth=frames,
+        exception_count=len(exceptions),
+    )
+
+
+def tier_accepts(tier: ModelTier, features: LogFeatures, tool: str) -> bool:
+    if tier.tools and tool not in tier.tools:
+        return False
+    if tier.max_log_tokens is not None and features.log_tokens > tier.max_log_tokens:
+        return False
+    if tier.max_stack_depth is not None and features.stack_depth > tier.max_stack_depth:
+        return False
+    if tier.max_exceptions is not None and features.exception_count > tier.max_exceptions:
+        return False
+    return True
+
+
+def select_tier_index(tiers: List[ModelTier], features: LogFeatures, tool: str) -> int:
+    """返回满足条件的最弱档位；均不满足时使用最强档位。"""
+    for idx, tier in enumerate(tiers):
+        if tier_accepts(tier, features, tool):
+            return idx
+    return len(tiers) - 1
+
+
+def is_low_confidence(report: object) -> bool:
+    """超过半数「待补充」字段仍为占位值时视为低置信度。"""
+    if not isinstance(report, BaseModel):
+        return False
+    placeholders = [
+        name for name, field in type(report).model_fields.items() if field.default == PLACEHOLDER
+    ]
+    if not placeholders:
+        return False
+    unfilled = sum(1 for name in placeholders if getattr(report, name) in ("", PLACEHOLDER))
+    return unfilled * 2 > len(placeholders)
+
+
+def request_report(
+    config: LLMConfig,
+    messages: List[Dict[str, str]],
+    parse: Callable[[str], T],
+    *,
+    tool: str,
+    features: Optional[LogFeatures] = None,
+    schema: Optional[Type[BaseModel]] = None,
+) -> T:
+    """按日志特征选择模型档位并请求 LLM；解析失败或低置信度时逐级升档。
+
+    未配置 tiers 时直接使用 `config.model`；schema 透传给各档位的结构化输出。
+    """
+    if not config.tiers:
+        client = LLMClient(config)
+        started = time.perf_counter()
+        raw_response = client.create_bug_report(messages, schema)
+        stats.observe(f"llm.latency.{config.model}", time.perf_counter() - started)
+        return parse(raw_response)
+
+    if features is None:
+        features = LogFeatures(log_tokens=0, stack_depth=0, exception_count=0)
+    start_idx = select_tier_index(config.tiers, features, tool)
+
+    last_error: Optional[Exception] = None
+    result: Optional[T] = None
+    for idx in range(start_idx, len(config.tiers)):
+        tier = config.tiers[idx]
+        has_next = idx + 1 < len(config.tiers)
+        client = LLMClient(config.for_tier(tier))
+        stats.incr(f"routing.{tier.name}.requests")
+
+        started = time.perf_counter()
+        raw_response = client.create_bug_report(messages, schema)
+        stats.observe(f"routing.{tier.name}.latency", time.perf_counter() - started)
+
+        try:
+            result = parse(raw_response)
+        except (ValueError, ValidationError) as exc:
+            last_error = exc
+            stats.incr(f"routing.{tier.name}.parse_failures")
+            if has_next:
+                console.print(f"[yellow]{tier.name} 输出无法解析，升级模型档位[/yellow]")
+            continue
+
+        if has_next and is_low_confidence(result):
+            stats.incr(f"routing.{tier.name}.low_confidence")
+            console.print(f"[yellow]{tier.name} 输出置信度较低，升级模型档位[/yellow]")
+            continue
+        return result
+
+    if result is not None:
+        return result
+    assert last_error is not None
+    raise last_error
@@ -0,0 +1,219 @@
+from __future__ import annotations
+
+import re
+import tomllib
+from functools import lru_cache
+from pathlib import Path
+from typing import List, Optional
+
+from pydantic import BaseModel, Field, PrivateAttr
+
+from .models import LLMReport
+from .stacktrace import StackTrace, parse_stack_trace
+
+
+class _FormatValues(dict):
+    """str.format_map 使用：缺失的占位符保持原样而不是抛 KeyError。"""
+
+    def __missing__(self, key: str) -> str:
+        return "{" + key + "}"
+
+
+class Rule(BaseModel):
+    """本地规则：正则命中日志后直接填充报告字段，字段支持 {分组名} 与 {command} 占位。"""
+
+    name: str
+    pattern: str
+    confidence: float = 0.9
+    # 规则对应的异常类型（不含包名）；日志中解析出的最终异常不在其中时不采用该规则
+    exception_types: List[str] = Field(default_factory=list)
+    bug_title: str
+    severity: str = Field(default="medium")
+    expected: str = Field(default="待补充")
+    actual: str = Field(default="{line}")
+    probable_cause: str
+    reproduction_steps: List[str] = Field(default_factory=lambda: ["执行命令: {command}"])
+    extra_notes: Optional[str] = None
+    tags: List[str] = Field(default_factory=list)
+
+    _compiled: Optional[re.Pattern[str]] = PrivateAttr(default=None)
+
+    @property
+    def regex(self) -> re.Pattern[str]:
+        if self._compiled is None:
+            self._compiled = re.compile(self.pattern, re.MULTILINE)
+        return self._compiled
+
+    def build_report(self, match: re.Match[str], command: str) -> LLMReport:
+        values = _FormatValues(
+            {key: value or "" for key, value in match.groupdict().items()},
+            line=match.group(0).strip(),
+            command=command,
+        )
+        return LLMReport(
+            bug_title=self.bug_title.format_map(values),
+            severity=self.severity,
+            expected=self.expected.format_map(values),
+            actual=self.actual.format_map(values),
+            probable_cause=self.probable_cause.format_map(values),
+            reproduction_steps=[step.format_map(values) for step in self.reproduction_steps],
+            extra_notes=self.extra_notes.format_map(values) if self.extra_notes else None,
+            tags=list(self.tags),
+        )
+
+
+class RuleMatch(BaseModel):
+    rule: str
+    confidence: float
+    report: LLMReport
+
+
+BUILTIN_RULES: List[Rule] = [
+    Rule(
+        name="file-not-found",
+        pattern=r"^\s*FileNotFoundError: (?:\[Errno 2\] )?(?P<message>.+)$",
+        exception_types=["FileNotFoundError"],
+        bug_title="文件缺失：{message}",
+        severity="medium",
+        expected="程序读取的文件存在，或在文件缺失时给出友好提示。",
+        probable_cause="运行时引用的文件路径不存在（路径拼写、工作目录或数据准备步骤有误）。",
+        tags=["文件", "FileNotFoundError"],
+    ),
+    Rule(
+        name="module-not-found",
+        pattern=r"^\s*ModuleNotFoundError: No module named '(?P<module>[^']+)'",
+        confidence=0.95,
+        exception_types=["ModuleNotFoundError"],
+        bug_title="依赖缺失：无法导入 {module}",
+        severity="high",
+        expected="依赖已安装，模块 {module} 可正常导入。",
+        probable_cause="当前环境未安装 {module}，或虚拟环境/PYTHONPATH 配置不正确。",
+        tags=["依赖", "ModuleNotFoundError"],
+    ),
+    Rule(
+        name="key-error",
+        pattern=r"^\s*KeyError: (?P<key>.+)$",
+        confidence=0.85,
+        exception_types=["KeyError"],
+        bug_title="字典键缺失：KeyError {key}",
+        severity="medium",
+        expected="数据中包含键 {key}，或代码对缺失键做了处理。",
+        probable_cause="访问了不存在的键 {key}，输入数据结构与代码假设不一致。",
+        tags=["数据", "KeyError"],
+    ),
+    Rule(
+        name="connection-refused",
+        # 只匹配异常行，避免「WARN ... Connection refused, retrying」之类的重试日志误命中
+        pattern=(
+            r"^\s*(?:[\w.]*ConnectionRefusedError\b.*"
+            r"|[\w.]*(?:Error|Exception): .*(?:Connection refused|ECONNREFUSED).*)$"
+        ),
+        confidence=0.85,
+        exception_types=[
+            "ConnectionRefusedError",
+            "ConnectionError",
+            "NewConnectionError",
+            "MaxRetryError",
+            "OperationalError",
+            "ConnectException",
+        ],
+        bug_title="连接被拒绝：目标服务不可达",
+        severity="high",
+        expected="目标服务已启动并可连接。",
+        probable_cause="目标服务未启动、端口/地址配置错误或被防火墙拦截。",
+        tags=["网络", "连接"],
+    ),
+    Rule(
+        name="pytest-assertion",
+        pattern=r"^E\s+(?P<assertion>(?:assert|AssertionError).+)$",
+        confidence=0.8,
+        exception_types=["AssertionError"],
+        bug_title="断言失败：{assertion}",
+        severity="medium",
+        expected="断言 {assertion} 成立。",
+        probable_cause="被测代码返回值与测试期望不一致，需对比断言两侧的差异。",
+        tags=["pytest", "断言"],
+    ),
+]
+
+
+class RuleEngine:
+    def __init__(self, rules: List[Rule]):
+        self.rules = rules
+
+    def match(
+        self, log_text: str, command: str = "unknown", trace: Optional[StackTrace] = None
+    ) -> Optional[RuleMatch]:
+        """返回日志中最后出现的命中（通常即最终异常）。
+
+        能解析出堆栈时以最后一个异常为准：声明了 exception_types 的规则只有在最终异常类型
+        与之相符时才会采用，避免前面的告警行或链式异常中的中间异常顶替真正的失败原因。
+        多条不同规则同时命中时说明日志存在多个问题，置信度下调 0.2。
+        """
+        trace = trace if trace is not None else parse_stack_trace(log_text)
+        final_type = (
+            trace.exceptions[-1].type.rsplit(".", 1)[-1] if trace.exceptions else None
+        )
+        best: Optional[tuple[int, Rule, re.Match[str]]] = None
+        hit_rules: set[str] = set()
+        for rule in self.rules:
+            last: Optional[re.Match[str]] = None
+            for last in rule.regex.finditer(log_text):
+                pass
+            if last is None:
+                continue
+            hit_rules.add(rule.name)
+            if final_type is not None and rule.exception_types and (
+                final_type not in rule.exception_types
+            ):
+                continue
+            if best is None or last.start() > best[0]:
+                best = (last.start(), rule, last)
+
+        if best is None:
+            return None
+
+        _, rule, found = best
+        confidence = rule.confidence - (0.2 if len(hit_rules) > 1 else 0.0)
+        return RuleMatch(
+            rule=rule.name,
+            confidence=max(confidence, 0.0),
+            report=rule.build_report(found, command),
+        )
+
+
+def load_rule_files(directory: Path) -> List[Rule]:
+    """读取目录下所有 *.toml 规则文件，每个文件包含若干 [[rules]] 表。"""
+    if not directory.is_dir():
+        raise FileNotFoundError(f"规则目录不存在: {directory}")
+
+    rules: List[Rule] = []
+    for path in sorted(directory.glob("*.toml")):
+        with path.open("rb") as fp:
+            data = tomllib.load(fp)
+        rules.extend(Rule.model_validate(item) for item in data.get("rules", []))
+    return rules
+
+
+@lru_cache(maxsize=8)
+def load_rule_engine(directory: Optional[Path]) -> RuleEngine:
+    """用户规则排在内置规则之前（同一位置命中时优先）；按目录缓存，避免每次请求重复读取。"""
+    rules: List[Rule] = []
+    if directory is not None:
+        rules.extend(load_rule_files(directory))
+    rules.extend(BUILTIN_RULES)
+    return RuleEngine(rules)
+
+
+def match_rules(
+    log_text: str,
+    command: str,
+    directory: Optional[Path],
+    threshold: float,
+    trace: Optional[StackTrace] = None,
+) -> Optional[RuleMatch]:
+    match = load_rule_engine(directory).match(log_text, command, trace)
+    if match is None or match.confidence < threshold:
+        return None
+    return match
+
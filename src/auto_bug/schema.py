@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+from functools import lru_cache
+from typing import Any, Dict, Optional, Set, Tuple, Type
+
+from pydantic import BaseModel
+
+from .config import LLMConfig
+
+# 已知支持 response_format={"type": "json_schema"} 的 provider；DeepSeek 仅支持 json_object
+JSON_SCHEMA_PROVIDERS = ("openai",)
+# 严格模式不支持的关键字，生成 schema 后移除
+UNSUPPORTED_KEYS = ("title", "default", "description")
+# 由本地从日志中提取、渲染时直接使用的字段；不进入 schema，避免严格模式迫使模型原样回显输入
+LOCAL_FIELDS = ("log_excerpt", "stack_summary")
+
+# auto 模式下服务端以 400 拒绝过 json_schema 的 (endpoint, model)，本进程内后续请求直接使用 json_object
+_rejected: Set[Tuple[str, str]] = set()
+
+
+def _endpoint_key(config: LLMConfig) -> Tuple[str, str]:
+    return (config.api_base or config.provider, config.model)
+
+
+def uses_json_schema(config: LLMConfig) -> bool:
+    """structured_output=auto 时仅对官方端点（未设置 api_base）的已知 provider 使用严格 JSON Schema。
+
+    自定义 api_base 常见于代理或兼容服务，未必支持 json_schema，auto 模式下一律退回 json_object。
+    """
+    if config.structured_output == "auto":
+        return (
+            config.provider in JSON_SCHEMA_PROVIDERS
+            and not config.api_base
+            and _endpoint_key(config) not in _rejected
+        )
+    return config.structured_output == "json_schema"
+
+
+def reject_json_schema(config: LLMConfig) -> None:
+    """记录该端点与模型不支持 json_schema（仅 auto 模式调用）。"""
+    _rejected.add(_endpoint_key(config))
+
+
+def schema_prompts(config: LLMConfig) -> bool:
+    """所有可能被路由到的档位都使用 JSON Schema 时，提示词才可以省略示例与字段列表。"""
+    if not config.tiers:
+        return uses_json_schema(config)
+    return all(uses_json_schema(config.for_tier(tier)) for tier in config.tiers)
+
+
+def _strict(node: Any) -> Any:
+    """按 OpenAI 严格模式改写 pydantic 生成的 schema：全部字段必填、禁止额外字段。
+
+    可选字段已由 pydantic 表示为 anyOf [..., null]，因此"必填"只意味着键必须出现。
+    """
+    if isinstance(node, list):
+        return [_strict(item) for item in node]
+    if not isinstance(node, dict):
+        return node
+    result: Dict[str, Any] = {}
+    for key, value in node.items():
+        if key == "properties":
+            # 字段名映射：键本身不按 UNSUPPORTED_KEYS 过滤，只去掉本地字段
+            result[key] = {
+                name: _strict(child) for name, child in value.items() if name not in LOCAL_FIELDS
+            }
+        elif key == "$defs":
+            result[key] = {name: _strict(child) for name, child in value.items()}
+        elif key not in UNSUPPORTED_KEYS:
+            result[key] = _strict(value)
+    if result.get("type") == "object" and "properties" in result:
+        result["required"] = list(result["properties"])
+        result["additionalProperties"] = False
+    return result
+
+
+@lru_cache(maxsize=None)
+def _model_schema(model: Type[BaseModel]) -> Dict[str, Any]:
+    return _strict(model.model_json_schema())
+
+
+def response_format(model: Optional[Type[BaseModel]], config: LLMConfig) -> Dict[str, Any]:
+    """返回请求体中的 response_format；不支持 schema 或未指定模型时退回 json_object。"""
+    if model is None or not uses_json_schema(config):
+        return {"type": "json_object"}
+    return {
+        "type": "json_schema",
+        "json_schema": {"name": model.__name__, "strict": True, "schema": _model_schema(model)},
+    }
@@ -0,0 +1,227 @@
+from __future__ import annotations
+
+import hashlib
+import re
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+PY_TRACEBACK = "Traceback (most recent call last):"
+PY_CHAIN_MARKERS = (
+    "During handling of the above exception, another exception occurred:",
+    "The above exception was the direct cause of the following exception:",
+)
+PY_FRAME = re.compile(r'^\s*File "(?P<file>[^"]+)", line (?P<line>\d+)(?:, in (?P<func>.+))?$')
+PY_EXCEPTION = re.compile(r"^(?P<type>[A-Za-z_][\w.]*)(?::\s?(?P<msg>.*))?$")
+
+JAVA_HEAD = re.compile(
+    r'^(?:Exception in thread "[^"]*" |Caused by: )?'
+    r"(?P<type>(?:[a-z_$][\w$]*\.)+[A-Z][\w$]*)(?::\s?(?P<msg>.*))?$"
+)
+JAVA_FRAME = re.compile(r"^\s+at (?P<func>[\w$.<>/]+)\((?P<file>[^:()]+)(?::(?P<line>\d+))?\)$")
+JAVA_MORE = re.compile(r"^\s+\.\.\. \d+ more$")
+
+JS_HEAD = re.compile(r"^(?:Uncaught )?(?P<type>[A-Z]\w*(?:Error|Exception))(?::\s?(?P<msg>.*))?$")
+JS_FRAME = re.compile(
+    r"^\s+at (?:(?:async )?(?P<func>[^\s(]+(?: \[as \w+\])?) \()?(?P<file>[^()\s]+?):(?P<line>\d+):\d+\)?$"
+)
+
+GO_PANIC = re.compile(r"^panic: (?P<msg>.*)$")
+GO_GOROUTINE = re.compile(r"^goroutine \d+ \[.*\]:$")
+GO_FUNC = re.compile(r"^(?P<func>[\w.*/()\[\]-]+)\(.*\)$")
+GO_FILE = re.compile(r"^\s+(?P<file>\S+\.go):(?P<line>\d+)(?: \+0x[0-9a-f]+)?$")
+
+FINGERPRINT_FRAMES = 3
+
+
+@dataclass(slots=True, frozen=True)
+class Frame:
+    file: str
+    line: int
+    function: str
+
+    def short(self) -> str:
+        name = self.file.replace("\\", "/").rsplit("/", 1)[-1]
+        return f"{name}:{self.line} in {self.function}"
+
+
+@dataclass(slots=True)
+class ExceptionRecord:
+    """单个异常；frames 统一为「最外层 -> 最内层」顺序，与 Python 输出一致。"""
+
+    language: str
+    type: str
+    message: str = ""
+    frames: List[Frame] = field(default_factory=list)
+
+
+@dataclass(slots=True)
+class StackTrace:
+    """按日志出现顺序排列的异常链，最后一项通常是最终抛出的异常。"""
+
+    exceptions: List[ExceptionRecord] = field(default_factory=list)
+
+    @property
+    def fingerprint(self) -> Optional[str]:
+        """异常类型 + 最内层若干帧（文件名与函数名，不含行号和消息）的稳定哈希。"""
+        if not self.exceptions:
+            return None
+        parts: List[str] = []
+        for record in self.exceptions:
+            parts.append(record.type)
+            for frame in record.frames[-FINGERPRINT_FRAMES:]:
+                name = frame.file.replace("\\", "/").rsplit("/", 1)[-1]
+                parts.append(f"{name}:{frame.function}")
+        return hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()[:12]
+
+    def condensed(self, max_frames: int = 12) -> str:
+        """输出去重、压缩后的帧列表：合并连续重复帧，链式异常中已出现过的帧不再重复。"""
+        lines: List[str] = []
+        seen: set[Frame] = set()
+        for record in self.exceptions:
+            header = f"[{record.language}] {record.type}"
+            if record.message:
+                header += f": {record.message}"
+            lines.append(header)
+
+            frames = [frame for frame in record.frames if frame not in seen]
+            seen.update(record.frames)
+            skipped = len(record.frames) - len(frames)
+
+            collapsed: List[tuple[Frame, int]] = []
+            for frame in frames:
+                if collapsed and collapsed[-1][0] == frame:
+                    collapsed[-1] = (frame, collapsed[-1][1] + 1)
+                else:
+                    collapsed.append((frame, 1))
+
+            if len(collapsed) > max_frames:
+                skipped += sum(count for _, count in collapsed[:-max_frames])
+                collapsed = collapsed[-max_frames:]
+            if skipped:
+                lines.append(f"  ...（省略 {skipped} 帧）")
+            for frame, count in collapsed:
+                suffix = f" (x{count})" if count > 1 else ""
+                lines.append(f"  {frame.short()}{suffix}")
+        return "\n".join(lines)
+
+
+def parse_stack_trace(raw: str) -> StackTrace:
+    """单遍扫描解析 Python（含链式异常）、Java/Kotlin、JavaScript/Node 与 Go 堆栈。"""
+    records: List[ExceptionRecord] = []
+    current: Optional[ExceptionRecord] = None
+    state = ""
+    go_func: Optional[str] = None
+
+    def close() -> None:
+        nonlocal current, state
+        if current is not None:
+            if current.language != "python":
+                current.frames.reverse()
+            records.append(current)
+        current = None
+        state = ""
+
+    for line in raw.splitlines():
+        line = line.rstrip()
+        stripped = line.strip()
+        if not stripped:
+            continue
+
+        if stripped == PY_TRACEBACK:
+            close()
+            current = ExceptionRecord(language="python", type="")
+            state = "python"
+            continue
+
+        if state == "python" and current is not None:
+            match = PY_FRAME.match(line)
+            if match:
+                current.frames.append(
+                    Frame(match["file"], int(match["line"]), (match["func"] or "<module>").strip())
+                )
+                continue
+            if line[0].isspace():
+                continue  # 源码行或 ^^^^ 标记
+            match = PY_EXCEPTION.match(stripped)
+            if match:
+                current.type = match["type"]
+                current.message = (match["msg"] or "").strip()
+            close()
+            continue
+
+        if stripped in PY_CHAIN_MARKERS:
+            close()
+            continue
+
+        if state == "java" and current is not None:
+            match = JAVA_FRAME.match(line)
+            if match:
+                current.frames.append(
+                    Frame(match["file"], int(match["line"] or 0), match["func"])
+                )
+                continue
+            if JAVA_MORE.match(line):
+                continue
+
+        if state == "js" and current is not None:
+            match = JS_FRAME.match(line)
+            if match:
+                current.frames.append(
+                    Frame(match["file"], int(match["line"]), match["func"] or "<anonymous>")
+                )
+                continue
+
+        if state == "go" and current is not None:
+            if GO_GOROUTINE.match(stripped):
+                continue
+            match = GO_FILE.match(line)
+            if match:
+                current.frames.append(
+                    Frame(match["file"], int(match["line"]), go_func or "<unknown>")
+                )
+                go_func = None
+                continue
+            match = GO_FUNC.match(stripped)
+            if match and not line[0].isspace():
+                go_func = match["func"]
+                continue
+
+        match = GO_PANIC.match(stripped)
+        if match:
+            close()
+            current = ExceptionRecord(language="go", type="panic", message=match["msg"].strip())
+            state = "go"
+            go_func = None
+            continue
+
+        match = JAVA_HEAD.match(stripped)
+        if match and not line[0].isspace():
+            close()
+            current = ExceptionRecord(
+                language="java", type=match["type"], message=(match["msg"] or "").strip()
+            )
+            state = "java"
+            continue
+
+        match = JS_HEAD.match(stripped)
+        if match and not line[0].isspace():
+            close()
+            current = ExceptionRecord(
+                language="js", type=match["type"], message=(match["msg"] or "").strip()
+            )
+            state = "js"
+            continue
+
+        if state in ("java", "js") and line[0].isspace() and stripped.startswith("at "):
+            continue  # 无法解析的帧（如 native / async 标注）直接跳过
+
+        if state in ("java", "js", "go"):
+            close()
+
+    close()
+
+    # 无帧的「XxxError: ...」单行多为日志噪声；存在带帧的异常时丢弃它们
+    if any(record.frames for record in records):
+        records = [record for record in records if record.frames]
+    records = [record for record in records if record.type]
+    return StackTrace(exceptions=records)
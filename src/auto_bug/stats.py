@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import threading
+from typing import Dict, Optional
+
+
+class StatsRegistry:
+    """进程内计数与耗时统计，供 MCP `server_stats` 工具查询。"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._counters: Dict[str, int] = {}
+        self._timings: Dict[str, Dict[str, float]] = {}
+        self._gauges: Dict[str, Dict[str, float]] = {}
+
+    def incr(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def observe(self, name: str, seconds: float) -> None:
+        with self._lock:
+            entry = self._timings.get(name)
+            if entry is None:
+                entry = {"count": 0, "total": 0.0, "min": seconds, "max": seconds}
+                self._timings[name] = entry
+            entry["count"] += 1
+            entry["total"] += seconds
+            entry["min"] = min(entry["min"], seconds)
+            entry["max"] = max(entry["max"], seconds)
+
+    def mean(self, name: str) -> Optional[float]:
+        with self._lock:
+            entry = self._timings.get(name)
+            if not entry or not entry["count"]:
+                return None
+            return entry["total"] / entry["count"]
+
+    def set_gauge(self, name: str, value: float) -> None:
+        """记录瞬时值（如队列深度），同时保留历史最大值。"""
+        with self._lock:
+            entry = self._gauges.setdefault(name, {"value": value, "max": value})
+            entry["value"] = value
+            entry["max"] = max(entry["max"], value)
+
+    def snapshot(self) -> dict[str, object]:
+        with self._lock:
+            timings = {
+                name: {
+                    "count": int(entry["count"]),
+                    "avg_seconds": round(entry["total"] / entry["count"], 4),
+                    "min_seconds": round(entry["min"], 4),
+                    "max_seconds": round(entry["max"], 4),
+                    "total_seconds": round(entry["total"], 4),
+                }
+                for name, entry in self._timings.items()
+            }
+            gauges = {name: dict(entry) for name, entry in self._gauges.items()}
+            return {"counters": dict(self._counters), "timings": timings, "gauges": gauges}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._timings.clear()
+            self._gauges.clear()
+
+
+stats = StatsRegistry()
@@ -1,10 +1,20 @@
 from __future__ import annotations
 
+import hashlib
+import json
+import os
+import re
+import threading
+from contextlib import contextmanager
 from pathlib import Path
+from typing import Any, Iterable, Iterator
+
 from rich.console import Console
 
 console = Console()
 
+REPORT_NAME = re.compile(r"^(bug|debug)\d+$")
+
 
 def ensure_project_dir(vault_root: Path, project: str) -> Path:
     project_dir = vault_root / project
@@ -12,37 +22,158 @@ def ensure_project_dir(vault_root: Path, project: str) -> Path:
     return project_dir
 
 
-def next_sequence_filename(project_dir: Path, prefix: str) -> tuple[str, Path]:
-    """查找指定前缀的下一个序号文件，例如 debug001、bug002。"""
-    existing = sorted(project_dir.glob(f"{prefix}*.md"))
+def _max_sequence(project_dir: Path, prefix: str) -> int:
     max_idx = 0
-    for item in existing:
+    for item in project_dir.glob(f"{prefix}*.md"):
         stem = item.stem
         if stem.startswith(prefix):
             suffix = stem[len(prefix) :]
             if suffix.isdigit():
                 max_idx = max(max_idx, int(suffix))
+    return max_idx
+
 
-    next_idx = max_idx + 1
+def next_sequence_filename(project_dir: Path, prefix: str) -> tuple[str, Path]:
+    """查找指定前缀的下一个序号文件，例如 debug001、bug002。"""
+    next_idx = _max_sequence(project_dir, prefix) + 1
     sequence = f"{next_idx:03d}"
     filename = project_dir / f"{prefix}{sequence}.md"
     return sequence, filename
 
 
+def next_shared_sequence(project_dir: Path, prefixes: Iterable[str]) -> tuple[str, dict[str, Path]]:
+    """为多个前缀分配同一个序号，例如 bug005.md 与 debug005.md。"""
+    prefixes = list(prefixes)
+    next_idx = max((_max_sequence(project_dir, prefix) for prefix in prefixes), default=0) + 1
+    sequence = f"{next_idx:03d}"
+    return sequence, {prefix: project_dir / f"{prefix}{sequence}.md" for prefix in prefixes}
+
+
+def _claim(path: Path) -> bool:
+    """以 O_CREAT|O_EXCL 创建空占位文件；已存在时返回 False。跨线程、跨进程均为原子操作。"""
+    try:
+        fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+    except FileExistsError:
+        return False
+    os.close(fd)
+    return True
+
+
+def claim_shared_sequence(
+    project_dir: Path, prefixes: Iterable[str]
+) -> tuple[str, dict[str, Path]]:
+    """原子地占用下一个序号：为每个前缀创建空占位文件，任一已被占用则释放本轮占位并尝试下一个序号。"""
+    prefixes = list(prefixes)
+    next_idx = max((_max_sequence(project_dir, prefix) for prefix in prefixes), default=0) + 1
+    while True:
+        sequence = f"{next_idx:03d}"
+        paths = {prefix: project_dir / f"{prefix}{sequence}.md" for prefix in prefixes}
+        claimed: list[Path] = []
+        for path in paths.values():
+            if not _claim(path):
+                break
+            claimed.append(path)
+        if len(claimed) == len(paths):
+            return sequence, paths
+        for path in claimed:
+            path.unlink(missing_ok=True)
+        next_idx += 1
+
+
+@contextmanager
+def reserve_report_files(
+    project_dir: Path, prefixes: Iterable[str], reserve: bool = True
+) -> Iterator[tuple[str, dict[str, Path]]]:
+    """分配报告序号。reserve=True 时原子占用文件名，退出时清理仍为空（未写入）的占位文件；
+
+    reserve=False（仅预览不写盘）时只计算下一个序号，不创建文件。
+    """
+    if not reserve:
+        yield next_shared_sequence(project_dir, prefixes)
+        return
+    sequence, paths = claim_shared_sequence(project_dir, prefixes)
+    try:
+        yield sequence, paths
+    finally:
+        for path in paths.values():
+            try:
+                if path.stat().st_size == 0:
+                    path.unlink()
+            except FileNotFoundError:
+                pass
+
+
 def next_bug_filename(project_dir: Path) -> tuple[str, Path]:
     """兼容旧逻辑：Bug 报告文件命名为 bugNNN.md。"""
     return next_sequence_filename(project_dir, "bug")
 
 
-def write_report_file(path: Path, content: str, label: str = "报告") -> None:
-    if path.exists():
-        console.print(f"[yellow]警告：目标文件已存在，跳过写入: {path}[/yellow]")
-        return
+def write_report_file(
+    path: Path, content: str, label: str = "报告", reserved: bool = False
+) -> bool:
+    """写入新报告；目标已存在时跳过并返回 False。
 
-    path.write_text(content, encoding="utf-8")
+    reserved=True 表示 path 是 reserve_report_files 创建的空占位文件，直接原子替换。
+    """
+    if reserved:
+        if not path.exists() or path.stat().st_size > 0:
+            console.print(f"[yellow]警告：占位文件已失效，跳过写入: {path}[/yellow]")
+            return False
+        replace_report_file(path, content)
+    elif not _claim(path):
+        console.print(f"[yellow]警告：目标文件已存在，跳过写入: {path}[/yellow]")
+        return False
+    else:
+        path.write_text(content, encoding="utf-8")
     console.print(f"[green]已创建 {label} 文档: {path}[/green]")
+    return True
 
 
-def write_bug_file(path: Path, content: str) -> None:
+def write_bug_file(path: Path, content: str) -> bool:
     """向后兼容的别名。"""
-    write_report_file(path, content, label="Bug")
+    return write_report_file(path, content, label="Bug")
+
+
+def project_path(vault_root: Path, project: str) -> Path:
+    """校验项目名（拒绝路径穿越），返回 Vault 内的项目目录，不创建目录。"""
+    if project in ("", ".", "..") or "/" in project or "\\" in project:
+        raise ValueError(f"非法的项目名称: {project}")
+    return vault_root / project
+
+
+def report_file(vault_root: Path, project: str, report: str) -> Path:
+    """校验项目名与报告名（bug003 / debug002.md），返回 Vault 内的 Markdown 路径。"""
+    name = Path(report).stem
+    if not REPORT_NAME.match(name):
+        raise ValueError(f"无法识别的报告名称: {report}（示例：bug003、debug002）")
+    return project_path(vault_root, project) / f"{name}.md"
+
+
+def sidecar_path(report_path: Path) -> Path:
+    """bug001.md -> bug001.json"""
+    return report_path.with_suffix(".json")
+
+
+def hash_payload(data: Any) -> str:
+    encoded = json.dumps(data, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()[:16]
+
+
+def write_sidecar(report_path: Path, data: dict[str, Any]) -> Path:
+    """在报告旁写入紧凑 JSON，保存结构化报告与渲染上下文，供重新渲染使用。"""
+    path = sidecar_path(report_path)
+    path.write_text(
+        json.dumps(data, ensure_ascii=False, separators=(",", ":")), encoding="utf-8"
+    )
+    return path
+
+
+def read_sidecar(path: Path) -> dict[str, Any]:
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def replace_report_file(path: Path, content: str) -> None:
+    """原子替换已有报告内容（先写临时文件再 rename），用于重新渲染。"""
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp_path.write_text(content, encoding="utf-8")
+    tmp_path.replace(path)
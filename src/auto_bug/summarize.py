@@ -0,0 +1,212 @@
+from __future__ import annotations
+
+import contextvars
+import hashlib
+import json
+import math
+import re
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Optional
+
+from pydantic import BaseModel
+from rich.console import Console
+
+from .cancellation import RequestCancelled
+from .cassette import CassetteMissError
+from .config import AppConfig, LLMConfig
+from .routing import request_report
+from .stats import stats
+from .usage import usage_scope
+
+console = Console()
+
+# 提示词变化时递增，使旧缓存失效
+PROMPT_VERSION = "1"
+# 优先在这些位置切分：异常开头、分隔线、CI 分组、pytest 段落、步骤编号
+BOUNDARY = re.compile(
+    r"^\s*(?:Traceback \(most recent call last\)|={3,}|-{3,}|#{1,3} |##\[group\]|::group::"
+    r"|(?:FAILED|FAILURES|ERROR|FAIL)\b|Step \d+|\[\d+/\d+\])"
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS summaries (
+    key TEXT PRIMARY KEY,
+    summary TEXT NOT NULL,
+    relevant INTEGER NOT NULL,
+    created REAL NOT NULL
+);
+"""
+
+
+class LogChunk(BaseModel):
+    start: int
+    end: int
+    text: str
+
+
+class ChunkSummary(BaseModel):
+    summary: str = ""
+    # 片段中没有错误、告警或关键状态变化时为 False，合并时省略
+    relevant: bool = True
+
+
+class SummaryCache:
+    """分段摘要缓存：键为模型 + 提示词版本 + 片段内容的哈希，同一日志重复分析时不再调用 LLM。"""
+
+    def __init__(self, path: Path):
+        self.path = path
+
+    def _connect(self) -> sqlite3.Connection:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+        return conn
+
+    def get(self, key: str) -> Optional[ChunkSummary]:
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT summary, relevant FROM summaries WHERE key = ?", (key,)
+            ).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            return None
+        return ChunkSummary(summary=row[0], relevant=bool(row[1]))
+
+    def put(self, key: str, summary: ChunkSummary) -> None:
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO summaries (key, summary, relevant, created) "
+                    "VALUES (?, ?, ?, ?)",
+                    (key, summary.summary, int(summary.relevant), time.time()),
+                )
+        finally:
+            conn.close()
+
+
+def cache_key(model: str, text: str) -> str:
+    return hashlib.sha256(f"{model}\n{PROMPT_VERSION}\n{text}".encode("utf-8")).hexdigest()
+
+
+def split_chunks(lines: List[str], chunk_lines: int) -> List[LogChunk]:
+    """按行切分：达到半段长度后遇到边界行即切分，最长不超过 chunk_lines。"""
+    chunks: List[LogChunk] = []
+    start = 0
+    for idx in range(1, len(lines)):
+        size = idx - start
+        if size >= chunk_lines or (size >= chunk_lines // 2 and BOUNDARY.match(lines[idx])):
+            chunks.append(LogChunk(start=start + 1, end=idx, text="\n".join(lines[start:idx])))
+            start = idx
+    if start < len(lines):
+        chunks.append(
+            LogChunk(start=start + 1, end=len(lines), text="\n".join(lines[start:]))
+        )
+    return chunks
+
+
+def build_chunk_messages(chunk: LogChunk, total_lines: int) -> list[dict[str, str]]:
+    return [
+        {
+            "role": "system",
+            "content": "你是日志分析助手，负责把长日志的一个片段压缩为简短摘要，供后续定位根因。",
+        },
+        {
+            "role": "user",
+            "content": (
+                "请严格输出 JSON：{\"summary\": \"...\", \"relevant\": true}。\n"
+                "summary 用不超过 5 行概括片段中的错误、异常、失败步骤、告警与关键状态变化，"
+                "保留异常类型、文件名与关键标识；片段中没有任何异常迹象时 relevant 为 false。\n"
+                f"片段位于日志第 {chunk.start}-{chunk.end} 行（共 {total_lines} 行）：\n"
+                f"```text\n{chunk.text}\n```"
+            ),
+        },
+    ]
+
+
+def parse_chunk_summary(raw: str) -> ChunkSummary:
+    from .core import slice_json_object  # core 依赖本模块，延迟导入避免循环
+
+    return ChunkSummary.model_validate(json.loads(slice_json_object(raw)))
+
+
+def summarize_log(
+    *,
+    base_dir: Path,
+    config: AppConfig,
+    project: str,
+    log_text: str,
+    tail_lines: int = 80,
+) -> Optional[str]:
+    """map-reduce：对日志末尾摘录之前的部分分段并行摘要，合并为按行号标注的概要。
+
+    未启用或日志不够长时返回 None；单段失败只跳过该段。
+    """
+    settings = config.summarize
+    if not settings.enabled:
+        return None
+    lines = log_text.strip().splitlines()
+    if len(lines) <= max(settings.min_lines, tail_lines):
+        return None
+
+    # 末尾 tail_lines 行会原样进入 log_excerpt，无需重复摘要
+    head = lines[:-tail_lines]
+    chunk_lines = max(settings.chunk_lines, math.ceil(len(head) / max(1, settings.max_chunks)))
+    chunks = split_chunks(head, chunk_lines)
+
+    llm_config: LLMConfig = config.llm.model_copy(
+        update={"tiers": [], **({"model": settings.model} if settings.model else {})}
+    )
+    cache = SummaryCache(config.resolve_summary_cache(base_dir))
+    ledger = config.resolve_usage_ledger(base_dir)
+
+    def summarize_chunk(chunk: LogChunk) -> Optional[ChunkSummary]:
+        key = cache_key(llm_config.model, chunk.text)
+        cached = cache.get(key)
+        if cached is not None:
+            stats.incr("summarize.cache_hits")
+            return cached
+        stats.incr("summarize.cache_misses")
+        try:
+            with usage_scope(ledger, project=project, tool="summarize", log_chars=len(chunk.text)):
+                summary = request_report(
+                    llm_config,
+                    build_chunk_messages(chunk, len(lines)),
+                    parse_chunk_summary,
+                    tool="summarize",
+                    schema=ChunkSummary,
+                )
+        except (CassetteMissError, RequestCancelled):
+            raise
+        except Exception as exc:  # pylint: disable=broad-except
+            stats.incr("summarize.failures")
+            console.print(f"[yellow]日志第 {chunk.start}-{chunk.end} 行摘要失败，已跳过：{exc}[/yellow]")
+            return None
+        cache.put(key, summary)
+        return summary
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, settings.max_concurrency)) as pool:
+        # 每个任务复制当前上下文，使限流优先级等 contextvar 在线程池中生效
+        futures = [
+            pool.submit(contextvars.copy_context().run, summarize_chunk, chunk) for chunk in chunks
+        ]
+        summaries = [future.result() for future in futures]
+    stats.observe("summarize.latency", time.perf_counter() - started)
+
+    if all(summary is None for summary in summaries):
+        return None
+    parts = [
+        f"[第 {chunk.start}-{chunk.end} 行] {summary.summary.strip()}"
+        for chunk, summary in zip(chunks, summaries)
+        if summary is not None and summary.relevant and summary.summary.strip()
+    ]
+    if not parts:
+        return f"日志前 {len(head)} 行未发现异常迹象。"
+    return "\n".join(parts)
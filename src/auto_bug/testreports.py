@@ -0,0 +1,289 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import re
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from typing import Any, Iterable, Iterator, List, Optional
+
+from pydantic import BaseModel, Field
+
+from .cancellation import RequestCancelled
+from .cassette import CassetteMissError
+from .config import AppConfig
+from .core import (
+    GenerationResult,
+    build_messages,
+    finalize_bug_record,
+    match_local_rules,
+    parse_llm_json,
+)
+from .logs import extract_excerpt, extract_stack_summary
+from .models import LLMReport
+from .ratelimit import PRIORITY_BATCH, request_priority
+from .routing import analyze_log, request_report
+from .stacktrace import parse_stack_trace
+from .stats import stats
+from .usage import usage_scope
+
+DEFAULT_MAX_SAMPLES = 3
+# pytest 长格式中的崩溃位置行，例如 "src/db.py:42: ConnectionRefusedError"
+PYTEST_CRASH = re.compile(r"^(?P<path>[^\s:]+\.py):(?P<line>\d+): (?P<type>[\w.]+)$")
+VOLATILE = re.compile(r"0x[0-9a-fA-F]+|\d+|'[^']*'|\"[^\"]*\"")
+
+
+class TestFailure(BaseModel):
+    nodeid: str
+    type: str = ""
+    message: str = ""
+    details: str = ""
+
+
+class FailureGroup(BaseModel):
+    signature: str
+    tests: List[str] = Field(default_factory=list)
+    samples: List[TestFailure] = Field(default_factory=list)
+
+
+class GroupResult(BaseModel):
+    signature: str
+    tests: List[str]
+    result: Optional[GenerationResult] = None
+    # 该组生成失败时的错误信息；其余分组不受影响
+    error: Optional[str] = None
+
+
+def _local_name(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+def iter_junit_failures(path: Path) -> Iterator[TestFailure]:
+    """流式解析 JUnit XML：处理完的 testcase 立即从父节点移除，内存占用与文件大小无关。"""
+    parents: List[ET.Element] = []
+    for event, elem in ET.iterparse(path, events=("start", "end")):
+        if event == "start":
+            parents.append(elem)
+            continue
+        parents.pop()
+        if _local_name(elem.tag) != "testcase":
+            continue
+
+        for child in elem:
+            if _local_name(child.tag) in ("failure", "error"):
+                classname = elem.get("classname", "")
+                name = elem.get("name", "")
+                yield TestFailure(
+                    nodeid=f"{classname}::{name}" if classname else name,
+                    type=child.get("type", ""),
+                    message=child.get("message", ""),
+                    details=(child.text or "").strip(),
+                )
+                break
+        if parents:
+            parents[-1].remove(elem)
+        elem.clear()
+
+
+def _longrepr_text(longrepr: Any) -> tuple[str, str]:
+    """pytest-reportlog 的 longrepr 可能是字符串或序列化后的 ReprExceptionInfo。"""
+    if longrepr is None:
+        return "", ""
+    if isinstance(longrepr, str):
+        return longrepr.strip().splitlines()[-1] if longrepr.strip() else "", longrepr
+    if isinstance(longrepr, list):  # skip 等场景为 [path, lineno, message]
+        return str(longrepr[-1]), str(longrepr[-1])
+
+    crash = longrepr.get("reprcrash") or {}
+    lines: List[str] = []
+    chain = longrepr.get("chain") or [[longrepr.get("reprtraceback") or {}, crash, None]]
+    for traceback, _crash, description in chain:
+        for entry in (traceback or {}).get("reprentries", []):
+            data = entry.get("data") or {}
+            lines.extend(data.get("lines") or [])
+            location = data.get("reprfileloc")
+            if location:
+                lines.append(f"{location['path']}:{location['lineno']}: {location['message']}")
+        if description:
+            lines.append(description)
+    return str(crash.get("message", "")), "\n".join(lines)
+
+
+def iter_reportlog_failures(path: Path) -> Iterator[TestFailure]:
+    """逐行读取 pytest --report-log 生成的 JSONL，提取失败（含 setup/teardown 错误）的用例。"""
+    with path.open(encoding="utf-8") as fp:
+        for line in fp:
+            line = line.strip()
+            if not line:
+                continue
+            entry = json.loads(line)
+            if entry.get("$report_type") != "TestReport" or entry.get("outcome") != "failed":
+                continue
+            message, details = _longrepr_text(entry.get("longrepr"))
+            exc_type = message.split(":", 1)[0].strip() if ":" in message else ""
+            yield TestFailure(
+                nodeid=entry.get("nodeid", ""), type=exc_type, message=message, details=details
+            )
+
+
+def iter_test_failures(path: Path) -> Iterator[TestFailure]:
+    """按扩展名选择解析器：.xml 为 JUnit，.jsonl / .json 为 pytest reportlog。"""
+    suffix = path.suffix.lower()
+    if suffix == ".xml":
+        return iter_junit_failures(path)
+    if suffix in (".jsonl", ".json"):
+        return iter_reportlog_failures(path)
+    raise ValueError(f"不支持的测试报告格式: {path}（支持 JUnit .xml 与 pytest reportlog .jsonl）")
+
+
+def failure_signature(failure: TestFailure) -> str:
+    """分组键：优先使用堆栈指纹，其次是 pytest 崩溃位置，最后退回异常类型 + 归一化消息。"""
+    trace = parse_stack_trace(failure.details)
+    if any(record.frames for record in trace.exceptions) and trace.fingerprint:
+        return trace.fingerprint
+
+    crashes = [
+        match for match in map(PYTEST_CRASH.match, failure.details.splitlines()) if match
+    ]
+    if crashes:
+        crash = crashes[-1]
+        key = f"{crash['path']}:{crash['line']}:{crash['type']}"
+    else:
+        first_line = failure.message.strip().splitlines()[0] if failure.message.strip() else ""
+        key = f"{failure.type}|{VOLATILE.sub('_', first_line)}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:12]
+
+
+def group_failures(
+    failures: Iterable[TestFailure], max_samples: int = DEFAULT_MAX_SAMPLES
+) -> List[FailureGroup]:
+    """按签名分组；每组只保留 max_samples 条消息互不相同的代表样本，其余只记录用例名。"""
+    groups: dict[str, FailureGroup] = {}
+    for failure in failures:
+        signature = failure_signature(failure)
+        group = groups.get(signature)
+        if group is None:
+            group = groups[signature] = FailureGroup(signature=signature)
+        group.tests.append(failure.nodeid)
+        if len(group.samples) < max_samples and all(
+            VOLATILE.sub("_", sample.message) != VOLATILE.sub("_", failure.message)
+            for sample in group.samples
+        ):
+            group.samples.append(failure)
+    return sorted(groups.values(), key=lambda group: len(group.tests), reverse=True)
+
+
+def build_group_log(group: FailureGroup, max_lines: int = 80) -> str:
+    """把代表样本拼成一段日志，每个样本平分行数预算，保证都能进入摘录。"""
+    per_sample = max(10, max_lines // max(1, len(group.samples)) - 2)
+    parts = [f"共 {len(group.tests)} 个测试因同一原因失败，以下为代表样本："]
+    for sample in group.samples:
+        body = sample.details or sample.message
+        parts.append(f"[{sample.nodeid}] {sample.message}".rstrip())
+        parts.append(extract_excerpt(body, max_lines=per_sample))
+    return "\n".join(parts)
+
+
+def generate_test_report_records(
+    *,
+    base_dir: Path,
+    config: AppConfig,
+    project: str,
+    source: Path,
+    command: str = "pytest",
+    environment: str = "CI",
+    persist: bool = True,
+    max_samples: int = DEFAULT_MAX_SAMPLES,
+    force_llm: bool = False,
+) -> List[GroupResult]:
+    """解析 JUnit XML / pytest reportlog，按失败签名分组，每组一次 LLM 调用、写一份报告。
+
+    单个分组失败（限流、超时、响应无法解析）时记录到 GroupResult.error 并继续处理其余分组。
+    """
+    groups = group_failures(iter_test_failures(source), max_samples=max_samples)
+    stats.incr("testreports.groups", len(groups))
+    stats.incr("testreports.failures", sum(len(group.tests) for group in groups))
+
+    results: List[GroupResult] = []
+    with request_priority(PRIORITY_BATCH):
+        for group in groups:
+            try:
+                result = _generate_group_record(
+                    base_dir=base_dir,
+                    config=config,
+                    project=project,
+                    group=group,
+                    command=command,
+                    environment=environment,
+                    persist=persist,
+                    force_llm=force_llm,
+                )
+            except (CassetteMissError, RequestCancelled):
+                raise
+            except Exception as exc:  # pylint: disable=broad-except
+                stats.incr("testreports.failed_groups")
+                results.append(
+                    GroupResult(signature=group.signature, tests=group.tests, error=str(exc))
+                )
+                continue
+            results.append(GroupResult(signature=group.signature, tests=group.tests, result=result))
+    return results
+
+
+def _generate_group_record(
+    *,
+    base_dir: Path,
+    config: AppConfig,
+    project: str,
+    group: FailureGroup,
+    command: str,
+    environment: str,
+    persist: bool,
+    force_llm: bool,
+) -> GenerationResult:
+    log_text = build_group_log(group)
+    trace = parse_stack_trace(log_text)
+    excerpt = extract_excerpt(log_text)
+    stack_summary = extract_stack_summary(log_text, trace=trace)
+
+    report = (
+        None if force_llm else match_local_rules(base_dir, config, excerpt, command, trace)
+    )
+    if report is None:
+        messages = build_messages(
+            config=config,
+            project=project,
+            command=command,
+            log_excerpt=excerpt,
+            stack_summary=stack_summary,
+            default_tags=config.llm.prompt.default_tags,
+        )
+        with usage_scope(
+            config.resolve_usage_ledger(base_dir),
+            project=project,
+            tool="test_report",
+            log_chars=len(log_text),
+        ):
+            report = request_report(
+                config.llm,
+                messages,
+                parse_llm_json,
+                tool="test_report",
+                features=analyze_log(excerpt, stack_summary, trace),
+                schema=LLMReport,
+            )
+
+    return finalize_bug_record(
+        base_dir=base_dir,
+        config=config,
+        project=project,
+        report=report,
+        command=command,
+        environment=environment,
+        excerpt=excerpt,
+        stack_summary=stack_summary,
+        persist=persist,
+        fingerprint=group.signature,
+        log_text=log_text,
+        affected_tests=group.tests,
+    )
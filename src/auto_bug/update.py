@@ -0,0 +1,265 @@
+from __future__ import annotations
+
+import difflib
+import json
+import re
+from pathlib import Path
+from typing import Any, List, Literal, Optional
+
+from pydantic import BaseModel
+
+from .archive import LogArchive, relative_link
+from .cancellation import raise_if_cancelled
+from .config import AppConfig
+from .core import (
+    archive_raw_log,
+    build_debug_render_context,
+    build_render_context,
+    slice_json_object,
+)
+from .logs import extract_excerpt, extract_stack_summary
+from .models import DebugReport, LLMReport, ReportSidecar
+from .renderer import render_markdown, template_hash
+from .routing import analyze_log, request_report
+from .stacktrace import parse_stack_trace
+from .stats import stats
+from .storage import (
+    hash_payload,
+    read_sidecar,
+    replace_report_file,
+    report_file,
+    sidecar_path,
+    write_sidecar,
+)
+from .usage import usage_scope
+
+# 比较时忽略时间戳与内存地址，避免每行都被视为变化
+VOLATILE = re.compile(
+    r"\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(?:[.,]\d+)?(?:Z|[+-]\d{2}:?\d{2})?"
+    r"|\b\d{2}:\d{2}:\d{2}(?:[.,]\d+)?"
+    r"|0x[0-9a-fA-F]+"
+)
+# 日志摘录与堆栈摘要由本地根据新日志重新生成，不交给 LLM
+LOCAL_FIELDS = {"log_excerpt", "stack_summary"}
+
+
+class UpdateResult(BaseModel):
+    project: str
+    name: str
+    kind: Literal["bug", "debug"]
+    file_path: Path
+    markdown: str
+    changed_fields: List[str]
+    delta_lines: int
+    llm_called: bool
+
+
+def resolve_report_path(vault_root: Path, project: str, report: str) -> Path:
+    """接受 bug003 / bug003.md / debug002 等名称，返回报告 Markdown 路径（要求侧文件存在）。"""
+    path = report_file(vault_root, project, report)
+    if not sidecar_path(path).exists():
+        raise FileNotFoundError(f"未找到报告侧文件: {sidecar_path(path)}")
+    return path
+
+
+def _normalize(line: str) -> str:
+    return VOLATILE.sub("#", line.strip())
+
+
+def compute_log_delta(previous: str, current: str, context: int = 2) -> str:
+    """返回新日志相对上次摘录新增或变化的行（附少量上下文，省略处以 … 分隔）。"""
+    old_lines = previous.splitlines()
+    new_lines = current.splitlines()
+    matcher = difflib.SequenceMatcher(
+        None,
+        [_normalize(line) for line in old_lines],
+        [_normalize(line) for line in new_lines],
+        autojunk=False,
+    )
+    keep: set[int] = set()
+    for tag, _i1, _i2, j1, j2 in matcher.get_opcodes():
+        if tag in ("insert", "replace"):
+            keep.update(range(max(0, j1 - context), min(len(new_lines), j2 + context)))
+
+    selected: List[str] = []
+    last = -1
+    for idx in sorted(keep):
+        if selected and idx != last + 1:
+            selected.append("…")
+        selected.append(new_lines[idx])
+        last = idx
+    return "\n".join(selected)
+
+
+def build_update_messages(
+    *,
+    kind: Literal["bug", "debug"],
+    project: str,
+    command: str,
+    prior: dict[str, Any],
+    log_delta: str,
+    stack_summary: Optional[str],
+) -> list[dict[str, str]]:
+    label = "缺陷报告" if kind == "bug" else "调试报告"
+    editable = [name for name in prior if name not in LOCAL_FIELDS]
+    user_payload: dict[str, Any] = {
+        "project": project,
+        "command": command,
+        "current_report": {name: prior[name] for name in editable},
+        "log_delta": log_delta,
+        "editable_fields": editable,
+    }
+    if stack_summary is not None:
+        user_payload["stack_summary"] = stack_summary
+
+    return [
+        {
+            "role": "system",
+            "content": (
+                f"你是一名资深工程师。用户重试修复后得到了新日志，请在已有{label}的基础上增量更新。"
+            ),
+        },
+        {
+            "role": "user",
+            "content": (
+                "log_delta 为新日志相对上次日志新增或变化的行，stack_summary 仅在堆栈变化时提供。\n"
+                "请严格输出 JSON 对象，只包含需要修改的字段及其新值；无需修改时输出 {}。\n"
+                f"当前输入：```json\n{json.dumps(user_payload, ensure_ascii=False)}\n```"
+            ),
+        },
+    ]
+
+
+def parse_patch(raw: str, prior: BaseModel) -> BaseModel:
+    """把 LLM 返回的部分字段合并进已有报告并重新校验。"""
+    data = json.loads(slice_json_object(raw))
+    if not isinstance(data, dict):
+        raise ValueError(f"LLM 增量输出不是 JSON 对象：{raw}")
+    fields = type(prior).model_fields
+    patch = {key: value for key, value in data.items() if key in fields and key not in LOCAL_FIELDS}
+    return type(prior).model_validate({**prior.model_dump(), **patch})
+
+
+def update_report(
+    *,
+    base_dir: Path,
+    config: AppConfig,
+    project: str,
+    report: str,
+    log_text: str,
+    command: Optional[str] = None,
+    environment: Optional[str] = None,
+) -> UpdateResult:
+    """用新日志增量更新已有报告：只把旧的结构化报告与日志增量发给 LLM，原地改写 Markdown 与侧文件。"""
+    path = resolve_report_path(config.vault_root, project, report)
+    sidecar = ReportSidecar.model_validate(read_sidecar(sidecar_path(path)))
+    report_model = LLMReport if sidecar.kind == "bug" else DebugReport
+    prior = report_model.model_validate(sidecar.report)
+    previous = sidecar.context
+    # 旧侧文件没有记录实际发送的摘录，只能退回渲染上下文中的值
+    previous_excerpt = (
+        sidecar.log_excerpt
+        if sidecar.log_excerpt is not None
+        else str(previous.get("log_excerpt", ""))
+    )
+    previous_stack = (
+        sidecar.stack_summary
+        if sidecar.stack_summary is not None
+        else str(previous.get("stack_summary", ""))
+    )
+
+    trace = parse_stack_trace(log_text)
+    excerpt = extract_excerpt(log_text)
+    stack_summary = extract_stack_summary(log_text, trace=trace)
+    delta = compute_log_delta(previous_excerpt, excerpt)
+    stack_changed = stack_summary.strip() != previous_stack.strip()
+    command = command or previous.get("command", "unknown")
+    environment = environment or previous.get("environment", "local")
+
+    updated = prior
+    llm_called = False
+    if delta or stack_changed:
+        tool = "update_report"
+        messages = build_update_messages(
+            kind=sidecar.kind,
+            project=project,
+            command=command,
+            prior=prior.model_dump(mode="json"),
+            log_delta=delta,
+            stack_summary=stack_summary if stack_changed else None,
+        )
+        with usage_scope(
+            config.resolve_usage_ledger(base_dir),
+            project=project,
+            tool=tool,
+            log_chars=len(log_text),
+        ):
+            updated = request_report(
+                config.llm,
+                messages,
+                lambda raw: parse_patch(raw, prior),
+                tool=tool,
+                features=analyze_log(delta, stack_summary, trace),
+            )
+        llm_called = True
+        stats.incr("update.llm_calls")
+    else:
+        stats.incr("update.unchanged")
+
+    changed = [
+        name
+        for name in report_model.model_fields
+        if name not in LOCAL_FIELDS and getattr(updated, name) != getattr(prior, name)
+    ]
+    # 摘录改由新日志生成，下次增量更新以此为基准
+    updated = updated.model_copy(
+        update={name: "" for name in LOCAL_FIELDS if name in report_model.model_fields}
+    )
+
+    context_args = dict(
+        sequence=previous["sequence"],
+        project=project,
+        command=command,
+        environment=environment,
+        excerpt=excerpt,
+        stack_summary=stack_summary,
+    )
+    if sidecar.kind == "bug":
+        context = build_render_context(report=updated, **context_args)
+        # ingest-tests 生成的报告保留受影响测试列表
+        context.affected_tests = list(previous.get("affected_tests") or [])
+        template_path = config.resolve_template(base_dir)
+    else:
+        context = build_debug_render_context(report=updated, **context_args)
+        template_path = config.resolve_debug_template(base_dir)
+    context.timestamp = previous.get("timestamp", context.timestamp)
+    context.raw_log = previous.get("raw_log")
+
+    raise_if_cancelled()
+    raw_log = archive_raw_log(base_dir, config, log_text)
+    if raw_log is not None:
+        context.raw_log = relative_link(raw_log, path)
+
+    markdown = render_markdown(template_path, context)
+    replace_report_file(path, markdown)
+    context_data = context.model_dump(mode="json")
+    sidecar.report = updated.model_dump(mode="json")
+    sidecar.context = context_data
+    sidecar.template_hash = template_hash(template_path)
+    sidecar.context_hash = hash_payload(context_data)
+    sidecar.log_excerpt = excerpt
+    sidecar.stack_summary = stack_summary
+    write_sidecar(path, sidecar.model_dump(mode="json"))
+    if raw_log is not None:
+        LogArchive(raw_log.archive_dir).add_reference(raw_log.digest, path)
+
+    return UpdateResult(
+        project=project,
+        name=path.stem,
+        kind=sidecar.kind,
+        file_path=path,
+        markdown=markdown,
+        changed_fields=changed,
+        delta_lines=len(delta.splitlines()),
+        llm_called=llm_called,
+    )
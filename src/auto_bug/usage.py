@@ -0,0 +1,209 @@
+from __future__ import annotations
+
+import sqlite3
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from pydantic import BaseModel
+from rich.console import Console
+
+from .stats import stats
+
+console = Console()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS usage (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts REAL NOT NULL,
+    project TEXT NOT NULL,
+    tool TEXT NOT NULL,
+    provider TEXT NOT NULL,
+    model TEXT NOT NULL,
+    status TEXT NOT NULL,
+    prompt_tokens INTEGER NOT NULL DEFAULT 0,
+    completion_tokens INTEGER NOT NULL DEFAULT 0,
+    cached_tokens INTEGER NOT NULL DEFAULT 0,
+    latency REAL NOT NULL,
+    log_chars INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS usage_ts ON usage (ts);
+"""
+
+GROUP_COLUMNS = {
+    "project": "project",
+    "tool": "tool",
+    "model": "provider || '/' || model",
+    "day": "date(ts, 'unixepoch', 'localtime')",
+    "log_size": (
+        "CASE WHEN log_chars < 2000 THEN '<2k' WHEN log_chars < 20000 THEN '2k-20k' "
+        "WHEN log_chars < 200000 THEN '20k-200k' ELSE '>=200k' END"
+    ),
+}
+
+
+class UsageScope(BaseModel):
+    ledger: Path
+    project: str = "unknown"
+    tool: str = "unknown"
+    log_chars: int = 0
+
+
+class UsageSummaryRow(BaseModel):
+    key: str
+    calls: int
+    errors: int
+    prompt_tokens: int
+    completion_tokens: int
+    cached_tokens: int
+    avg_latency: float
+    max_latency: float
+
+
+_scope: ContextVar[Optional[UsageScope]] = ContextVar("auto_bug_usage_scope", default=None)
+
+
+@contextmanager
+def usage_scope(
+    ledger: Optional[Path], *, project: str, tool: str, log_chars: int = 0
+) -> Iterator[None]:
+    """为当前上下文内的 LLM 调用附加账本路径与标签；ledger 为 None 时不记录。"""
+    if ledger is None:
+        yield
+        return
+    token = _scope.set(UsageScope(ledger=ledger, project=project, tool=tool, log_chars=log_chars))
+    try:
+        yield
+    finally:
+        _scope.reset(token)
+
+
+def _connect(path: Path) -> sqlite3.Connection:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=10)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def parse_usage(data: Dict[str, Any]) -> tuple[int, int, int]:
+    """兼容 OpenAI（prompt_tokens_details.cached_tokens）与 DeepSeek（prompt_cache_hit_tokens）。"""
+    usage = data.get("usage") or {}
+    details = usage.get("prompt_tokens_details") or {}
+    cached = details.get("cached_tokens") or usage.get("prompt_cache_hit_tokens") or 0
+    return (
+        int(usage.get("prompt_tokens") or 0),
+        int(usage.get("completion_tokens") or 0),
+        int(cached),
+    )
+
+
+def record_call(
+    *,
+    provider: str,
+    model: str,
+    status: str,
+    latency: float,
+    prompt_tokens: int = 0,
+    completion_tokens: int = 0,
+    cached_tokens: int = 0,
+) -> None:
+    """追加一条调用记录；当前上下文未设置 usage_scope 时忽略。
+
+    账本不可写（锁定、只读、目录无权限等）时只告警，不影响已经拿到的 LLM 响应。
+    """
+    scope = _scope.get()
+    if scope is None:
+        return
+    try:
+        _insert(
+            scope, provider, model, status, latency, prompt_tokens, completion_tokens, cached_tokens
+        )
+    except (sqlite3.Error, OSError) as exc:
+        stats.incr("usage.write_failures")
+        console.print(f"[yellow]用量账本写入失败，已跳过：{exc}[/yellow]")
+
+
+def _insert(
+    scope: UsageScope,
+    provider: str,
+    model: str,
+    status: str,
+    latency: float,
+    prompt_tokens: int,
+    completion_tokens: int,
+    cached_tokens: int,
+) -> None:
+    conn = _connect(scope.ledger)
+    try:
+        with conn:
+            conn.execute(
+                "INSERT INTO usage (ts, project, tool, provider, model, status, prompt_tokens, "
+                "completion_tokens, cached_tokens, latency, log_chars) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    time.time(),
+                    scope.project,
+                    scope.tool,
+                    provider,
+                    model,
+                    status,
+                    prompt_tokens,
+                    completion_tokens,
+                    cached_tokens,
+                    latency,
+                    scope.log_chars,
+                ),
+            )
+    finally:
+        conn.close()
+
+
+def summarize_usage(
+    ledger: Path,
+    group_by: str = "project",
+    since_days: Optional[float] = None,
+    project: Optional[str] = None,
+) -> List[UsageSummaryRow]:
+    column = GROUP_COLUMNS.get(group_by)
+    if column is None:
+        raise ValueError(f"不支持的分组维度: {group_by}（可选 {', '.join(GROUP_COLUMNS)}）")
+    if not ledger.exists():
+        return []
+
+    clauses: List[str] = []
+    params: List[Any] = []
+    if since_days is not None:
+        clauses.append("ts >= ?")
+        params.append(time.time() - since_days * 86400)
+    if project:
+        clauses.append("project = ?")
+        params.append(project)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+    query = (
+        f"SELECT {column} AS key, COUNT(*), SUM(status != 'ok'), SUM(prompt_tokens), "
+        "SUM(completion_tokens), SUM(cached_tokens), AVG(latency), MAX(latency) "
+        f"FROM usage {where} GROUP BY key ORDER BY SUM(prompt_tokens + completion_tokens) DESC"
+    )
+    conn = _connect(ledger)
+    try:
+        rows = conn.execute(query, params).fetchall()
+    finally:
+        conn.close()
+
+    return [
+        UsageSummaryRow(
+            key=str(row[0]),
+            calls=row[1],
+            errors=row[2] or 0,
+            prompt_tokens=row[3] or 0,
+            completion_tokens=row[4] or 0,
+            cached_tokens=row[5] or 0,
+            avg_latency=round(row[6] or 0.0, 3),
+            max_latency=round(row[7] or 0.0, 3),
+        )
+        for row in rows
+    ]